@@ -1,8 +1,30 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import io
-import json
+import os
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import uuid
+import zipfile
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from openpyxl import load_workbook
+from instrumentation import (
+    span, timed, begin_run, end_run, record_run, new_profile_history, log_path, memory_from_env, profile_lines
+)
+from reporting import (
+    CATEGORY_LIST, SUBCATEGORIES, DamageStore, damages_frame, category_label,
+    normalize_category, parse_category_label, entry_triple, rollup_totals, period_frame, add_to_totals, remove_from_totals,
+    copy_totals, totals_from_frame, group_damages, safe_project_name, write_project_file, read_project_file,
+    format_currency, format_currency_column, write_excel_report, write_legal_summary, write_legal_summary_pdf,
+    build_excel_export, build_summary_export, build_summary_pdf_export, build_csv_export, build_project_export,
+    export_file
+)
 
 st.set_page_config(
     page_title="Damage Invoice Tracker",
@@ -19,389 +41,1166 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-CATEGORY_LIST = [
-    "Property Damage",
-    "Economic/Financial Loss",
-    "Medical & Health-Related",
-    "Emotional & Psychological Damages",
-    "Loss of Companionship or Consortium",
-    "Punitive Damages",
-    "Special Circumstances",
-    "Legal & Administrative Costs",
-    "Future Damages",
-    "Miscellaneous",
-    "Other"
-]
-
-SUBCATEGORIES = {
-    "Property Damage": [
-        "Vehicle repair/replacement", "Rental vehicle costs",
-        "Damage to home or real estate", "Damage to personal belongings", "Other"
-    ],
-    "Economic/Financial Loss": [
-        "Lost wages or income", "Loss of earning capacity", "Business interruption",
-        "Out-of-pocket expenses", "Replacement costs", "Other"
-    ],
-    "Medical & Health-Related": [
-        "Medical bills", "Medication costs", "Rehabilitation or physical therapy",
-        "Mental health therapy", "Other"
-    ],
-    "Emotional & Psychological Damages": [
-        "Pain and suffering", "Emotional distress", "Loss of enjoyment of life",
-        "Grief and bereavement", "Other"
-    ],
-    "Special Circumstances": [
-        "Pet loss and related costs", "Temporary housing costs",
-        "Childcare expenses", "Travel expenses", "Other"
-    ],
-    "Legal & Administrative Costs": [
-        "Attorney fees", "Court filing fees", "Expert witness fees", "Other"
-    ],
-    "Future Damages": [
-        "Projected medical care", "Future therapy", "Long-term disability costs", "Other"
-    ]
+
+SUBCATEGORY_PLACEHOLDER = "Select..."
+
+UPLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+THUMBNAIL_DIR = os.path.join(UPLOAD_DIR, "thumbs")
+ARCHIVE_DIR = os.path.join(UPLOAD_DIR, "archive")
+THUMBNAIL_SIZE = (320, 320)
+ARCHIVE_MAX_SIZE = (2400, 2400)
+ARCHIVE_JPEG_QUALITY = 85
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+RECEIPT_ID_HASH_LENGTH = 16
+
+MAX_REPORTED_ERRORS = 20
+BUNDLE_PROJECT_FILE = "project.jsonl"
+BUNDLE_RECEIPT_DIR = "receipts/"
+BUNDLE_REPORT_DIR = "reports/"
+# Limits for building and importing bundles; imports are checked against the
+# ZIP directory before anything is extracted
+BUNDLE_MAX_BYTES = 1024 * 1024 * 1024
+BUNDLE_MAX_MEMBERS = 20000
+EDIT_PAGE_SIZES = [25, 50, 100, 250]
+RECEIPT_FILTERS = {"Any": None, "With receipt": True, "Without receipt": False}
+TIMELINE_SPLITS = {"Top-level category": "top", "Category": "category", "None": None}
+
+PROJECT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "projects.db")
+PROJECT_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_date TEXT NOT NULL DEFAULT '',
+    drive_folder_url TEXT NOT NULL DEFAULT '',
+    updated_at TEXT NOT NULL DEFAULT '',
+    uuid TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS damages (
+    id INTEGER PRIMARY KEY,
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    date TEXT NOT NULL,
+    category TEXT NOT NULL,
+    cost REAL NOT NULL,
+    receipt TEXT NOT NULL DEFAULT '',
+    link TEXT NOT NULL DEFAULT '',
+    category_top TEXT NOT NULL DEFAULT '',
+    category_sub TEXT NOT NULL DEFAULT '',
+    category_custom TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_damages_project ON damages(project_id);
+CREATE INDEX IF NOT EXISTS idx_damages_project_category ON damages(project_id, category);
+CREATE INDEX IF NOT EXISTS idx_damages_project_date ON damages(project_id, date);
+CREATE TABLE IF NOT EXISTS receipts (
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    receipt_id TEXT NOT NULL,
+    blob TEXT NOT NULL,
+    original_name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (project_id, receipt_id)
+);
+CREATE INDEX IF NOT EXISTS idx_receipts_blob ON receipts(blob);
+CREATE TABLE IF NOT EXISTS imports (
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    file_hash TEXT NOT NULL,
+    file_name TEXT NOT NULL DEFAULT '',
+    rows INTEGER NOT NULL,
+    imported_at TEXT NOT NULL,
+    PRIMARY KEY (project_id, file_hash)
+);
+"""
+DAMAGE_INSERT_SQL = (
+    "INSERT INTO damages (project_id, title, description, date, category, cost, receipt, link, "
+    "category_top, category_sub, category_custom) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+IMPORT_CHUNK_ROWS = 5000
+# Spreadsheet headers (lower-cased) accepted by the bulk import
+IMPORT_COLUMNS = {
+    "title": "Title", "item": "Title", "name": "Title",
+    "description": "Description", "details": "Description", "notes": "Description", "memo": "Description",
+    "date": "Date", "transaction date": "Date",
+    "category": "Category", "subcategory": "Subcategory",
+    "cost": "Cost", "amount": "Cost", "price": "Cost", "total": "Cost",
+    "receipt": "Receipt", "link": "Link"
 }
+IMPORT_REQUIRED_COLUMNS = ("Title", "Date", "Category", "Cost")
 
-if "damages" not in st. session_state:
-    st.session_state["damages"] = []
-if "drive_folder_url" not in st. session_state:
+
+if "damages" not in st.session_state:
+    st.session_state["damages"] = DamageStore()
+if "drive_folder_url" not in st.session_state:
     st.session_state["drive_folder_url"] = ""
-if "drive_folder_configured" not in st. session_state:
+if "drive_folder_configured" not in st.session_state:
     st.session_state["drive_folder_configured"] = False
-if "uploaded_files_data" not in st. session_state:
+if "uploaded_files_data" not in st.session_state:
     st.session_state["uploaded_files_data"] = {}
+if "receipt_jobs" not in st.session_state:
+    st.session_state["receipt_jobs"] = {}
 if "project_name" not in st.session_state:
     st.session_state["project_name"] = ""
-if "project_created_date" not in st. session_state:
+if "project_created_date" not in st.session_state:
     st.session_state["project_created_date"] = ""
-if "project_active" not in st. session_state:
+if "project_uuid" not in st.session_state:
+    st.session_state["project_uuid"] = ""
+if "project_active" not in st.session_state:
     st.session_state["project_active"] = False
-if "delete_mode" not in st. session_state:
+if "delete_mode" not in st.session_state:
     st.session_state["delete_mode"] = False
+if "damages_version" not in st.session_state:
+    st.session_state["damages_version"] = 0
+if "export_cache" not in st.session_state:
+    st.session_state["export_cache"] = {}
+if "damage_totals" not in st.session_state:
+    st.session_state["damage_totals"] = None
+if "damage_groups" not in st.session_state:
+    st.session_state["damage_groups"] = None
+if "totals_snapshot" not in st.session_state:
+    st.session_state["totals_snapshot"] = None
+if "import_repeat" not in st.session_state:
+    st.session_state["import_repeat"] = None
+if "load_conflict" not in st.session_state:
+    st.session_state["load_conflict"] = None
+if "project_id" not in st.session_state:
+    st.session_state["project_id"] = None
+if "damage_row_ids" not in st.session_state:
+    st.session_state["damage_row_ids"] = []
+if "profile_history" not in st.session_state:
+    st.session_state["profile_history"] = new_profile_history()
+if "profile_open_run" not in st.session_state:
+    st.session_state["profile_open_run"] = None
+if "profile_memory" not in st.session_state:
+    st.session_state["profile_memory"] = False
+if "profile_session" not in st.session_state:
+    st.session_state["profile_session"] = os.urandom(4).hex()
+
+# Profiling is on while the debug panel is open (?debug=1) or when runs are
+# logged to DAMAGE_PROFILE_LOG; otherwise spans cost nothing
+debug_panel = st.query_params.get("debug") == "1"
+if debug_panel or log_path():
+    if st.session_state["profile_open_run"] is not None:
+        # The previous rerun was cut short, usually by st.rerun()
+        record_run(end_run(st.session_state["profile_open_run"], "interrupted"),
+                   st.session_state["profile_history"], st.session_state["profile_session"])
+    st.session_state["profile_open_run"] = begin_run("rerun", st.session_state["profile_memory"] or memory_from_env())
+
+
+@st.cache_resource
+def init_project_db():
+    # Creates the schema once per process and returns the database path
+    with closing(sqlite3.connect(PROJECT_DB_PATH)) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(PROJECT_DB_SCHEMA)
+        # Databases from before entries stored their category triple; their
+        # rows keep empty columns and are resolved from the label on load
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(damages)")]
+        for column in ("category_top", "category_sub", "category_custom"):
+            if column not in columns:
+                conn.execute("ALTER TABLE damages ADD COLUMN " + column + " TEXT NOT NULL DEFAULT ''")
+        # Projects from before they had a stable identity get one now
+        if "uuid" not in [row[1] for row in conn.execute("PRAGMA table_info(projects)")]:
+            conn.execute("ALTER TABLE projects ADD COLUMN uuid TEXT NOT NULL DEFAULT ''")
+        conn.execute("UPDATE projects SET uuid = lower(hex(randomblob(16))) WHERE uuid = ''")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_projects_uuid ON projects(uuid)")
+        conn.commit()
+    return PROJECT_DB_PATH
+
+
+def connect_project_db():
+    # Short-lived connections keep the store safe to use from any thread
+    conn = sqlite3.connect(init_project_db(), timeout=10)
+    conn.execute("PRAGMA foreign_keys = ON")
+    # FULL syncs the log on every commit, so an edit that was saved is kept
+    # even if the machine crashes or loses power right after. NORMAL would
+    # only sync at checkpoints and could lose the last edits. Edits come one
+    # at a time from the UI, so the extra sync is not noticeable.
+    conn.execute("PRAGMA synchronous = FULL")
+    return conn
+
+
+def damage_row(project_id, dmg):
+    triple = entry_triple(dmg)
+    return (project_id, dmg['Title'], dmg.get('Description', ''), dmg['Date'], category_label(*triple),
+            float(dmg['Cost']), dmg.get('Receipt', ''), dmg.get('Link', '')) + triple
+
+
+def db_create_project(project):
+    # Returns the new project id and the row ids of its damages in list order.
+    # A project loaded from a file counts as updated when the file was saved.
+    now = project.get("last_saved") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with closing(connect_project_db()) as conn, conn:
+        project_id = conn.execute(
+            "INSERT INTO projects (name, created_date, drive_folder_url, updated_at, uuid) VALUES (?, ?, ?, ?, ?)",
+            (project["project_name"], project["project_created_date"], project["drive_folder_url"], now,
+             project.get("project_uuid") or uuid.uuid4().hex)
+        ).lastrowid
+        row_ids = []
+        for dmg in project["damages"]:
+            row_ids.append(conn.execute(DAMAGE_INSERT_SQL, damage_row(project_id, dmg)).lastrowid)
+    return project_id, row_ids
+
+
+def db_find_project(project_uuid):
+    # Returns (id, updated_at) of the stored project, or None
+    with closing(connect_project_db()) as conn:
+        return conn.execute("SELECT id, updated_at FROM projects WHERE uuid = ? ORDER BY id LIMIT 1",
+                            (project_uuid,)).fetchone()
+
+
+def db_replace_project(project_id, project):
+    # Overwrites a stored project with a loaded copy of it and returns the
+    # new row ids. Receipts no entry refers to any more are forgotten.
+    now = project.get("last_saved") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with closing(connect_project_db()) as conn, conn:
+        conn.execute(
+            "UPDATE projects SET name = ?, created_date = ?, drive_folder_url = ?, updated_at = ? WHERE id = ?",
+            (project["project_name"], project["project_created_date"], project["drive_folder_url"], now, project_id)
+        )
+        conn.execute("DELETE FROM damages WHERE project_id = ?", (project_id,))
+        row_ids = []
+        for dmg in project["damages"]:
+            row_ids.append(conn.execute(DAMAGE_INSERT_SQL, damage_row(project_id, dmg)).lastrowid)
+        conn.execute("DELETE FROM receipts WHERE project_id = ? AND receipt_id NOT IN "
+                     "(SELECT receipt FROM damages WHERE project_id = ?)", (project_id, project_id))
+        # The imported rows were replaced along with all the others
+        conn.execute("DELETE FROM imports WHERE project_id = ?", (project_id,))
+    return row_ids
+
+
+def db_list_projects():
+    with closing(connect_project_db()) as conn:
+        return conn.execute(
+            "SELECT p.id, p.name, p.created_date, p.updated_at, COUNT(d.id), COALESCE(SUM(d.cost), 0) "
+            "FROM projects p LEFT JOIN damages d ON d.project_id = p.id "
+            "GROUP BY p.id ORDER BY p.updated_at DESC"
+        ).fetchall()
+
+
+def db_load_project(project_id):
+    # Returns None when there is no such project
+    with closing(connect_project_db()) as conn:
+        found = conn.execute(
+            "SELECT name, created_date, drive_folder_url, uuid FROM projects WHERE id = ?", (project_id,)
+        ).fetchone()
+        if found is None:
+            return None
+        name, created, drive_url, project_uuid = found
+        rows = conn.execute(
+            "SELECT id, title, description, date, category, cost, receipt, link, "
+            "category_top, category_sub, category_custom "
+            "FROM damages WHERE project_id = ? ORDER BY id", (project_id,)
+        ).fetchall()
+        receipts = conn.execute(
+            "SELECT receipt_id, blob, original_name, size FROM receipts WHERE project_id = ?", (project_id,)
+        ).fetchall()
+    project = {
+        "project_name": name,
+        "project_created_date": created,
+        "drive_folder_url": drive_url,
+        "project_uuid": project_uuid,
+        "damages": [{"Title": r[1], "Description": r[2], "Date": r[3], "Category": r[4],
+                     "Taxonomy": (r[8], r[9], r[10]) if r[8] else None,
+                     "Cost": r[5], "Receipt": r[6], "Link": r[7]} for r in rows]
+    }
+    return project, [r[0] for r in rows], receipts
+
+
+def db_touch_project(conn, project_id):
+    conn.execute("UPDATE projects SET updated_at = ? WHERE id = ?",
+                 (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), project_id))
+
+
+def db_add_damage(project_id, dmg):
+    with closing(connect_project_db()) as conn, conn:
+        row_id = conn.execute(DAMAGE_INSERT_SQL, damage_row(project_id, dmg)).lastrowid
+        db_touch_project(conn, project_id)
+    return row_id
+
+
+def db_add_damages(project_id, damages, source=None):
+    # source is the (hash, name) of the file the damages were imported from.
+    # It is recorded in the same transaction, so either both the rows and the
+    # record are stored or neither is.
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with closing(connect_project_db()) as conn, conn:
+        row_ids = [conn.execute(DAMAGE_INSERT_SQL, damage_row(project_id, dmg)).lastrowid for dmg in damages]
+        if source is not None:
+            conn.execute(
+                "INSERT OR REPLACE INTO imports (project_id, file_hash, file_name, rows, imported_at) "
+                "VALUES (?, ?, ?, ?, ?)", (project_id, source[0], source[1], len(damages), now)
+            )
+        db_touch_project(conn, project_id)
+    return row_ids
+
+
+def db_find_import(project_id, file_hash):
+    # Returns (file name, rows, imported at) of an earlier import of the file
+    with closing(connect_project_db()) as conn:
+        return conn.execute(
+            "SELECT file_name, rows, imported_at FROM imports WHERE project_id = ? AND file_hash = ?",
+            (project_id, file_hash)
+        ).fetchone()
+
+
+def db_delete_damages(project_id, row_ids):
+    with closing(connect_project_db()) as conn, conn:
+        conn.executemany("DELETE FROM damages WHERE id = ?", [(row_id,) for row_id in row_ids])
+        db_touch_project(conn, project_id)
+
+
+def db_update_drive_folder(project_id, drive_folder_url):
+    with closing(connect_project_db()) as conn, conn:
+        conn.execute("UPDATE projects SET drive_folder_url = ? WHERE id = ?", (drive_folder_url, project_id))
+        db_touch_project(conn, project_id)
+
+
+def db_save_receipts(project_id, receipts):
+    with closing(connect_project_db()) as conn, conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO receipts (project_id, receipt_id, blob, original_name, size) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(project_id, receipt_id, meta['blob'], meta['original_name'], meta['size'])
+             for receipt_id, meta in receipts.items()]
+        )
+
+
+def db_delete_receipt(project_id, receipt_id):
+    with closing(connect_project_db()) as conn, conn:
+        conn.execute("DELETE FROM receipts WHERE project_id = ? AND receipt_id = ?", (project_id, receipt_id))
+
+
+def db_blob_in_use(blob_name):
+    with closing(connect_project_db()) as conn:
+        return conn.execute("SELECT 1 FROM receipts WHERE blob = ? LIMIT 1", (blob_name,)).fetchone() is not None
 
 
 def save_uploaded_file(uploaded_file):
-    bytes_data = uploaded_file.getvalue()
-    filename = uploaded_file. name
-    timestamp = int(datetime.now(). timestamp())
-    unique_filename = str(timestamp) + "_" + filename
-    st.session_state["uploaded_files_data"][unique_filename] = {
-        'data': bytes_data,
+    return store_receipt(uploaded_file, uploaded_file.name)
+
+
+def store_receipt(fileobj, filename, receipt_id=None):
+    # Only metadata is kept in the session, the bytes live in UPLOAD_DIR.
+    # The receipt id is derived from the content hash, so re-uploading the
+    # same file reuses the existing entry instead of storing it again.
+    # Restored bundles pass the id recorded in the project instead.
+    blob_name, size = store_receipt_blob(fileobj, filename)
+    if receipt_id is None:
+        receipt_id = blob_name[:RECEIPT_ID_HASH_LENGTH] + "_" + filename
+    if receipt_id in st.session_state["uploaded_files_data"]:
+        return receipt_id
+    
+    st.session_state["uploaded_files_data"][receipt_id] = {
+        'blob': blob_name,
         'original_name': filename,
-        'size': len(bytes_data)
+        'size': size,
+        'refs': 0
     }
-    return unique_filename
+    acquire_receipt_blob(blob_name)
+    if st.session_state["project_id"] is not None:
+        db_save_receipts(st.session_state["project_id"],
+                         {receipt_id: st.session_state["uploaded_files_data"][receipt_id]})
+    if blob_name.endswith(IMAGE_EXTENSIONS):
+        st.session_state["receipt_jobs"][receipt_id] = submit_receipt_image(blob_name)
+    return receipt_id
+
+
+@st.cache_resource
+def get_blob_registry():
+    # Process-wide count of sessions holding each blob. Blobs are shared
+    # between sessions through content addressing, so a blob is only removed
+    # from disk once no session in this process and no saved project
+    # references it.
+    return {"lock": threading.Lock(), "counts": {}}
+
+
+def acquire_receipt_blob(blob_name):
+    registry = get_blob_registry()
+    with registry["lock"]:
+        registry["counts"][blob_name] = registry["counts"].get(blob_name, 0) + 1
+
+
+def release_receipt_blob(blob_name, registry=None):
+    if registry is None:
+        registry = get_blob_registry()
+    with registry["lock"]:
+        count = registry["counts"].get(blob_name, 0) - 1
+        if count > 0:
+            registry["counts"][blob_name] = count
+            return
+        registry["counts"].pop(blob_name, None)
+        if db_blob_in_use(blob_name):
+            return
+        for path in (os.path.join(UPLOAD_DIR, blob_name), receipt_thumbnail_path(blob_name),
+                     receipt_archive_path(blob_name)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def retain_receipt(receipt_id):
+    meta = st.session_state["uploaded_files_data"].get(receipt_id)
+    if meta is not None:
+        meta['refs'] = meta['refs'] + 1
+
+
+def release_receipt(receipt_id):
+    meta = st.session_state["uploaded_files_data"].get(receipt_id)
+    if meta is None:
+        return
+    meta['refs'] = meta['refs'] - 1
+    if meta['refs'] <= 0:
+        if st.session_state["project_id"] is not None:
+            db_delete_receipt(st.session_state["project_id"], receipt_id)
+        drop_receipt(receipt_id)
+
+
+def restore_receipts(receipts):
+    # Brings receipt metadata of a saved project back into the session
+    for receipt_id, blob_name, original_name, size in receipts:
+        if receipt_id in st.session_state["uploaded_files_data"]:
+            continue
+        meta = {'blob': blob_name, 'original_name': original_name, 'size': size, 'refs': 0}
+        meta.update(processed_receipt_image(blob_name) or {})
+        st.session_state["uploaded_files_data"][receipt_id] = meta
+        acquire_receipt_blob(blob_name)
+
+
+def drop_receipt(receipt_id):
+    meta = st.session_state["uploaded_files_data"].pop(receipt_id)
+    job = st.session_state["receipt_jobs"].pop(receipt_id, None)
+    if job is not None:
+        # Let the thumbnail worker finish before the blob disappears
+        registry = get_blob_registry()
+        job.add_done_callback(lambda done: release_receipt_blob(meta['blob'], registry))
+    else:
+        release_receipt_blob(meta['blob'])
+
+
+def recount_receipt_refs():
+    # Used when the damages list is replaced wholesale
+    receipts = st.session_state["damages"].frame()['Receipt']
+    refs = receipts[receipts != ''].value_counts().to_dict()
+    for receipt_id in list(st.session_state["uploaded_files_data"]):
+        if refs.get(receipt_id, 0) == 0:
+            drop_receipt(receipt_id)
+        else:
+            st.session_state["uploaded_files_data"][receipt_id]['refs'] = refs[receipt_id]
+
+
+def store_receipt_blob(fileobj, filename):
+    # Streams the upload to disk while hashing it. Blobs are named by their
+    # SHA-256 so identical receipts are stored once across all sessions.
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            fileobj.seek(0)
+            chunk = fileobj.read(UPLOAD_CHUNK_SIZE)
+            while chunk:
+                digest.update(chunk)
+                out.write(chunk)
+                size = size + len(chunk)
+                chunk = fileobj.read(UPLOAD_CHUNK_SIZE)
+        
+        blob_name = digest.hexdigest() + os.path.splitext(filename)[1].lower()
+        blob_path = os.path.join(UPLOAD_DIR, blob_name)
+        if os.path.exists(blob_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, blob_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return blob_name, size
+
+
+@st.cache_resource
+def get_receipt_pool():
+    # Shared by all sessions so image work never runs on the script thread
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="receipts")
+
+
+@st.cache_resource
+def get_image_jobs():
+    # Image processing in flight per blob, shared by all sessions so a
+    # receipt uploaded by two sessions at once is only processed once
+    return {"lock": threading.RLock(), "jobs": {}}
+
+
+def submit_receipt_image(blob_name):
+    registry = get_image_jobs()
+    with registry["lock"]:
+        job = registry["jobs"].get(blob_name)
+        if job is None:
+            job = get_receipt_pool().submit(process_receipt_image, blob_name)
+            registry["jobs"][blob_name] = job
+            job.add_done_callback(lambda done: forget_image_job(registry, blob_name, done))
+    return job
+
+
+def forget_image_job(registry, blob_name, job):
+    with registry["lock"]:
+        if registry["jobs"].get(blob_name) is job:
+            del registry["jobs"][blob_name]
+
+
+def receipt_thumbnail_path(blob_name):
+    return os.path.join(THUMBNAIL_DIR, os.path.splitext(blob_name)[0] + ".jpg")
+
+
+def receipt_archive_path(blob_name):
+    return os.path.join(ARCHIVE_DIR, blob_name)
+
+
+def processed_receipt_image(blob_name):
+    # The thumbnail is written last, so it marks a blob as fully processed
+    thumb_path = receipt_thumbnail_path(blob_name)
+    if not os.path.exists(thumb_path):
+        return None
+    result = {'thumbnail': thumb_path}
+    archive_path = receipt_archive_path(blob_name)
+    if os.path.exists(archive_path):
+        result['archive'] = archive_path
+        result['archive_size'] = os.path.getsize(archive_path)
+    return result
+
+
+def process_receipt_image(blob_name):
+    # Writes a JPEG thumbnail and, when that is smaller, a downscaled and
+    # recompressed copy without EXIF data next to the upload. The original
+    # blob is never modified so it keeps matching its SHA-256 name.
+    done = processed_receipt_image(blob_name)
+    if done is not None:
+        return done
+    
+    blob_path = os.path.join(UPLOAD_DIR, blob_name)
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    is_jpeg = blob_name.endswith((".jpg", ".jpeg"))
+    with Image.open(blob_path) as original:
+        img = ImageOps.exif_transpose(original)
+        if is_jpeg or img.mode not in ("RGB", "RGBA", "L", "P"):
+            img = img.convert("RGB")
+        
+        archive = img.copy()
+        archive.thumbnail(ARCHIVE_MAX_SIZE)
+        fd, archive_tmp = tempfile.mkstemp(dir=ARCHIVE_DIR, suffix=".part")
+        with os.fdopen(fd, "wb") as out:
+            if is_jpeg:
+                archive.save(out, "JPEG", quality=ARCHIVE_JPEG_QUALITY, optimize=True)
+            else:
+                archive.save(out, "PNG", optimize=True)
+        
+        thumb = img.convert("RGB")
+        thumb.thumbnail(THUMBNAIL_SIZE)
+        fd, thumb_tmp = tempfile.mkstemp(dir=THUMBNAIL_DIR, suffix=".part")
+        with os.fdopen(fd, "wb") as out:
+            thumb.save(out, "JPEG", quality=80)
+    
+    if os.path.getsize(archive_tmp) < os.path.getsize(blob_path):
+        os.replace(archive_tmp, receipt_archive_path(blob_name))
+    else:
+        os.remove(archive_tmp)
+    os.replace(thumb_tmp, receipt_thumbnail_path(blob_name))
+    return processed_receipt_image(blob_name)
+
+
+def collect_receipt_jobs():
+    # Copies finished image processing results into the receipt metadata
+    jobs = st.session_state["receipt_jobs"]
+    for name in [n for n, job in jobs.items() if job.done()]:
+        job = jobs.pop(name)
+        meta = st.session_state["uploaded_files_data"].get(name)
+        if meta is None:
+            continue
+        if job.exception() is not None:
+            meta['processing_error'] = str(job.exception())
+        else:
+            meta.update(job.result())
+
+
+def format_file_size(size):
+    if size < 1024:
+        return str(size) + " B"
+    if size < 1024 * 1024:
+        return "{:.1f} KB".format(size / 1024)
+    return "{:.1f} MB".format(size / (1024 * 1024))
+
+
+def receipt_path(receipt_name):
+    meta = st.session_state["uploaded_files_data"].get(receipt_name)
+    if meta is None:
+        return None
+    return os.path.join(UPLOAD_DIR, meta['blob'])
+
+
+def receipt_reader(path):
+    # Callable for st.download_button so the file is only read when requested
+    def read():
+        with open(path, "rb") as f:
+            return f.read()
+    return read
 
 
 def generate_drive_link(folder_url, filename):
     if folder_url:
-        return folder_url. rstrip('/') + "/" + filename
+        return folder_url.rstrip('/') + "/" + filename
     return filename
 
 
-def save_project_to_json():
-    project_data = {
+def current_project():
+    return {
         "project_name": st.session_state["project_name"],
         "project_created_date": st.session_state["project_created_date"],
         "drive_folder_url": st.session_state["drive_folder_url"],
-        "damages": st.session_state["damages"],
-        "last_saved": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "project_uuid": st.session_state["project_uuid"],
+        "damages": st.session_state["damages"]
     }
-    return json.dumps(project_data, indent=2)
 
 
-def load_project_from_json(json_data):
-    try:
-        project_data = json.loads(json_data)
-        st.session_state["project_name"] = project_data. get("project_name", "")
-        st.session_state["project_created_date"] = project_data.get("project_created_date", "")
-        st.session_state["drive_folder_url"] = project_data.get("drive_folder_url", "")
-        st. session_state["drive_folder_configured"] = bool(project_data. get("drive_folder_url"))
-        st.session_state["damages"] = project_data. get("damages", [])
-        st. session_state["project_active"] = True
-        return True
-    except Exception as e:
-        st.error("Error loading project: " + str(e))
+def load_project_file(fileobj, on_newer=None):
+    # on_newer is how to settle a stored copy of the project that changed
+    # after the file was saved, see settle_newer_copy
+    if zipfile.is_zipfile(fileobj):
+        return load_project_bundle(fileobj, on_newer)
+    project, errors = read_project_file(fileobj)
+    if not report_project_errors(errors) or not settle_newer_copy(fileobj, project, on_newer):
         return False
+    apply_project(project)
+    return True
 
 
-def delete_damage_entry(index):
-    if index >= 0 and index < len(st. session_state["damages"]):
-        return st.session_state["damages"].pop(index)
-    return None
+def settle_newer_copy(fileobj, project, on_newer):
+    # A file of a project the store already has replaces the stored copy,
+    # unless that copy was changed after the file was saved. Nothing is
+    # loaded then until the user chooses to "replace" the copy anyway or to
+    # load the file as a new "copy" of the project; the conflict is kept in
+    # the session for the prompt. Returns whether loading can go ahead.
+    found = db_find_project(project["project_uuid"]) if project["project_uuid"] else None
+    if found is None or found[1] <= project["last_saved"] or on_newer == "replace":
+        return True
+    if on_newer == "copy":
+        project["project_uuid"] = uuid.uuid4().hex
+        return True
+    st.session_state["load_conflict"] = (getattr(fileobj, "file_id", None), found[1], project["last_saved"])
+    return False
 
 
-def format_currency(amount):
-    return "${:,.2f}".format(amount)
+def report_project_errors(errors, heading="Error loading project"):
+    if errors:
+        shown = errors[:MAX_REPORTED_ERRORS]
+        if len(errors) > len(shown):
+            shown.append("... and " + str(len(errors) - len(shown)) + " more")
+        st.error(heading + ":\n\n" + "\n".join("- " + e for e in shown))
+        return False
+    return True
 
 
-def create_excel_report(damages_df, project_name):
-    output = io.BytesIO()
-    
-    if len(damages_df) == 0:
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            pd.DataFrame({'Message': ['No damages recorded']}).to_excel(
-                writer, sheet_name='No Data', index=False)
-        return output. getvalue()
-    
-    with pd. ExcelWriter(output, engine='openpyxl') as writer:
-        total_cost = damages_df['Cost'].sum()
-        
-        # Sheet 1: Executive Summary
-        summary_rows = [
-            ['DAMAGE CLAIM SUMMARY REPORT', '', ''],
-            ['Project: ' + project_name, '', ''],
-            ['', '', ''],
-            ['Report Generated:', datetime.now().strftime("%Y-%m-%d %H:%M"), ''],
-            ['', '', ''],
-            ['KEY METRICS', '', ''],
-            ['Total Damages Claimed:', format_currency(total_cost), ''],
-            ['Number of Damage Items:', len(damages_df), ''],
-            ['Number of Categories:', damages_df['Category']. nunique(), ''],
-            ['Average Damage Amount:', format_currency(damages_df['Cost'].mean()), ''],
-            ['Highest Single Damage:', format_currency(damages_df['Cost'].max()), ''],
-            ['Lowest Single Damage:', format_currency(damages_df['Cost'].min()), ''],
-            ['Date Range:', str(damages_df['Date'].min()) + " to " + str(damages_df['Date'].max()), ''],
-            ['', '', ''],
-            ['CATEGORY BREAKDOWN', 'Amount', 'Percentage']
-        ]
-        
-        for category in sorted(damages_df['Category'].unique()):
-            cat_total = damages_df[damages_df['Category'] == category]['Cost'].sum()
-            pct = (cat_total / total_cost * 100) if total_cost > 0 else 0
-            summary_rows. append([category, format_currency(cat_total), "{:.1f}%".format(pct)])
-        
-        summary_rows.append(['', '', ''])
-        summary_rows.append(['GRAND TOTAL:', format_currency(total_cost), '100. 0%'])
-        
-        pd.DataFrame(summary_rows).to_excel(writer, sheet_name='Executive Summary', index=False, header=False)
-        
-        # Sheet 2: All Damages Categorized
-        cat_rows = [
-            ['COMPREHENSIVE DAMAGE LIST BY CATEGORY', '', '', '', '', '', ''],
-            ['Project: ' + project_name, '', '', '', '', '', ''],
-            ['', '', '', '', '', '', '']
-        ]
-        
-        sorted_df = damages_df. sort_values(['Category', 'Date'])
-        current_cat = None
-        cat_totals = {}
-        
-        for idx, row in sorted_df.iterrows():
-            if current_cat != row['Category']:
-                if current_cat is not None:
-                    cat_rows. append(['', '', '', '', '', '', ''])
-                    cat_rows.append(['', '', '', 'SUBTOTAL - ' + current_cat + ':',
-                                    format_currency(cat_totals[current_cat]), '', ''])
-                    cat_rows.append(['', '', '', '', '', '', ''])
-                
-                current_cat = row['Category']
-                cat_totals[current_cat] = 0
-                cat_rows.append(['=== CATEGORY: ' + current_cat + ' ===', '', '', '', '', '', ''])
-                cat_rows.append(['Date', 'Title', 'Description', 'Amount', 'Receipt File', 'Link', 'Notes'])
-            
-            cat_rows.append([
-                row['Date'], row['Title'], row. get('Description', ''),
-                format_currency(row['Cost']), row.get('Receipt', ''), row.get('Link', ''), ''
-            ])
-            cat_totals[current_cat] = cat_totals[current_cat] + row['Cost']
-        
-        if current_cat:
-            cat_rows.append(['', '', '', '', '', '', ''])
-            cat_rows.append(['', '', '', 'SUBTOTAL - ' + current_cat + ':',
-                            format_currency(cat_totals[current_cat]), '', ''])
-        
-        cat_rows.append(['', '', '', '', '', '', ''])
-        cat_rows.append(['', '', '', 'GRAND TOTAL:', format_currency(total_cost), '', ''])
-        
-        pd.DataFrame(cat_rows).to_excel(writer, sheet_name='All Damages Categorized', index=False, header=False)
-        
-        # Sheet 3: Category Analysis
-        analysis_rows = [
-            ['DETAILED CATEGORY ANALYSIS', '', '', '', ''],
-            ['Project: ' + project_name, '', '', '', ''],
-            ['', '', '', '', '']
-        ]
-        
-        for category in sorted(damages_df['Category'].unique()):
-            cat_data = damages_df[damages_df['Category'] == category]
-            cat_total = cat_data['Cost'].sum()
-            pct = (cat_total / total_cost * 100) if total_cost > 0 else 0
-            
-            analysis_rows. append(['=== ' + category + ' ===', '', '', '', ''])
-            analysis_rows.append(['Number of Items:', len(cat_data), '', '', ''])
-            analysis_rows.append(['Total Amount:', format_currency(cat_total), '', '', ''])
-            analysis_rows.append(['Percentage of Total:', "{:.1f}%".format(pct), '', '', ''])
-            analysis_rows.append(['Average per Item:', format_currency(cat_data['Cost'].mean()), '', '', ''])
-            analysis_rows.append(['Highest Item:', format_currency(cat_data['Cost'].max()), '', '', ''])
-            analysis_rows.append(['Lowest Item:', format_currency(cat_data['Cost']. min()), '', '', ''])
-            analysis_rows.append(['', '', '', '', ''])
-        
-        pd.DataFrame(analysis_rows).to_excel(writer, sheet_name='Category Analysis', index=False, header=False)
-        
-        # Sheet 4: Chronological View
-        chrono_rows = [
-            ['CHRONOLOGICAL DAMAGE LIST', '', '', '', ''],
-            ['Project: ' + project_name, '', '', '', ''],
-            ['', '', '', '', ''],
-            ['Date', 'Category', 'Title', 'Amount', 'Running Total']
-        ]
-        
-        sorted_chrono = damages_df.sort_values('Date')
-        running = 0
-        for idx, row in sorted_chrono.iterrows():
-            running = running + row['Cost']
-            chrono_rows.append([row['Date'], row['Category'], row['Title'],
-                               format_currency(row['Cost']), format_currency(running)])
-        
-        chrono_rows.append(['', '', '', '', ''])
-        chrono_rows.append(['', '', 'FINAL TOTAL:', format_currency(total_cost), ''])
-        
-        pd.DataFrame(chrono_rows).to_excel(writer, sheet_name='Chronological View', index=False, header=False)
-        
-        # Sheet 5: Receipt Status
-        receipt_rows = [
-            ['RECEIPT DOCUMENTATION STATUS', '', '', ''],
-            ['Project: ' + project_name, '', '', ''],
-            ['', '', '', ''],
-            ['Status', 'Count', 'Amount', '']
-        ]
-        
-        with_rec = damages_df[damages_df['Receipt'] != '']
-        without_rec = damages_df[damages_df['Receipt'] == '']
-        
-        receipt_rows.append(['With Receipts:', len(with_rec), format_currency(with_rec['Cost'].sum()), ''])
-        receipt_rows.append(['Without Receipts:', len(without_rec), format_currency(without_rec['Cost']. sum()), ''])
-        receipt_rows.append(['Total:', len(damages_df), format_currency(total_cost), ''])
-        receipt_rows.append(['', '', '', ''])
-        
-        if len(without_rec) > 0:
-            receipt_rows.append(['ITEMS NEEDING RECEIPTS:', '', '', ''])
-            receipt_rows.append(['Date', 'Title', 'Amount', ''])
-            for idx, row in without_rec.iterrows():
-                receipt_rows.append([row['Date'], row['Title'], format_currency(row['Cost']), ''])
+@timed()
+def apply_project(project, project_id=None, row_ids=None, receipts=None):
+    # Makes project the active one. Projects that are not in the project
+    # store yet (new or loaded from a file) are saved there first. A file
+    # of a project the store already has, by its uuid, replaces that
+    # project instead of adding a copy; load_project_file asks first when
+    # the stored copy is the newer one.
+    if project_id is None:
+        if not project.get("project_uuid"):
+            project["project_uuid"] = uuid.uuid4().hex
+        found = db_find_project(project["project_uuid"])
+        if found is None:
+            project_id, row_ids = db_create_project(project)
         else:
-            receipt_rows.append(['All items have receipts', '', '', ''])
-        
-        receipt_rows.append(['', '', '', ''])
-        receipt_rows.append(['Google Drive:', st.session_state. get("drive_folder_url", "Not configured"), '', ''])
-        
-        pd.DataFrame(receipt_rows).to_excel(writer, sheet_name='Receipt Status', index=False, header=False)
-    
-    return output.getvalue()
+            project_id = found[0]
+            row_ids = db_replace_project(project_id, project)
+    st.session_state["project_id"] = project_id
+    st.session_state["project_uuid"] = project["project_uuid"]
+    st.session_state["damage_row_ids"] = row_ids
+    st.session_state["project_name"] = project["project_name"]
+    st.session_state["project_created_date"] = project["project_created_date"]
+    st.session_state["drive_folder_url"] = project["drive_folder_url"]
+    st.session_state["drive_folder_configured"] = bool(project["drive_folder_url"])
+    st.session_state["damages"] = DamageStore(project["damages"])
+    if receipts:
+        restore_receipts(receipts)
+    reset_damage_totals()
+    db_save_receipts(project_id, st.session_state["uploaded_files_data"])
+    st.session_state["project_active"] = True
+    # Lets a reload of the page reopen the project
+    st.query_params["project"] = str(project_id)
 
 
-def create_legal_summary(damages_df, project_name):
-    if len(damages_df) == 0:
-        return "No damages recorded."
-    
-    total = damages_df['Cost'].sum()
-    lines = []
-    
-    lines.append("=" * 80)
-    lines. append("DAMAGE CLAIM DOCUMENTATION - LEGAL SUMMARY REPORT")
-    lines.append("=" * 80)
-    lines.append("")
-    lines.append("PROJECT: " + project_name)
-    lines.append("GENERATED: " + datetime.now().strftime('%Y-%m-%d %H:%M'))
-    lines.append("")
-    lines. append("-" * 80)
-    lines.append("I. EXECUTIVE SUMMARY")
-    lines.append("-" * 80)
-    lines.append("")
-    lines.append("TOTAL DAMAGES CLAIMED: " + format_currency(total))
-    lines.append("")
-    lines.append("Key Statistics:")
-    lines. append("  Total Items: " + str(len(damages_df)))
-    lines. append("  Categories: " + str(damages_df['Category']. nunique()))
-    lines.append("  Date Range: " + str(damages_df['Date'].min()) + " to " + str(damages_df['Date'].max()))
-    lines.append("  Average: " + format_currency(damages_df['Cost'].mean()))
-    lines.append("  Highest: " + format_currency(damages_df['Cost'].max()))
-    lines.append("  Lowest: " + format_currency(damages_df['Cost']. min()))
-    lines.append("")
-    lines.append("-" * 80)
-    lines.append("II. BREAKDOWN BY CATEGORY")
-    lines.append("-" * 80)
-    
-    for category in sorted(damages_df['Category'].unique()):
-        cat_data = damages_df[damages_df['Category'] == category]
-        cat_total = cat_data['Cost'].sum()
-        pct = (cat_total / total * 100) if total > 0 else 0
+def open_saved_project(project_id):
+    loaded = db_load_project(project_id)
+    if loaded is None:
+        return False
+    project, row_ids, receipts = loaded
+    apply_project(project, project_id, row_ids, receipts)
+    return True
+
+
+def restore_session_project():
+    # A browser refresh or server restart starts a fresh session. Every edit
+    # is already in the project store, so the project named in the URL is
+    # simply reopened from there.
+    requested = st.query_params.get("project", "")
+    if st.session_state["project_id"] is not None or not requested.isdigit():
+        return
+    if not open_saved_project(int(requested)):
+        st.query_params.pop("project", None)
+
+
+def write_project_bundle(out, project):
+    # Writes a ZIP with the project file, every referenced receipt and the
+    # attorney reports. Each member is streamed into the archive, receipts
+    # straight from disk, so the bundle is never held in memory as a whole.
+    name = safe_project_name(project["project_name"])
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        with zf.open(BUNDLE_PROJECT_FILE, "w") as member:
+            with io.TextIOWrapper(member, encoding="utf-8") as text:
+                write_project_file(text, project)
         
-        lines.append("")
-        lines.append(category. upper())
-        lines.append("=" * len(category))
-        lines.append("Total: " + format_currency(cat_total) + " ({:.1f}%)".format(pct))
-        lines. append("Items: " + str(len(cat_data)))
-        lines. append("Average: " + format_currency(cat_data['Cost'].mean()))
-        lines.append("")
-        lines.append("Itemized:")
+        referenced = set(dmg['Receipt'] for dmg in project["damages"] if dmg.get('Receipt'))
+        for receipt_id, meta in project["receipts"].items():
+            path = os.path.join(UPLOAD_DIR, meta['blob'])
+            if receipt_id in referenced and os.path.exists(path):
+                zf.write(path, BUNDLE_RECEIPT_DIR + receipt_id, compress_type=zipfile.ZIP_STORED)
         
-        for idx, row in cat_data. iterrows():
-            lines.append("  - " + str(row['Date']) + " | " + row['Title'] + " | " + format_currency(row['Cost']))
+        with zf.open(BUNDLE_REPORT_DIR + name + "_Report.xlsx", "w") as member:
+            write_excel_report(member, project["damages"], project["project_name"], project["drive_folder_url"],
+                               project["damage_totals"])
+        with zf.open(BUNDLE_REPORT_DIR + name + "_Summary.txt", "w") as member:
+            write_legal_summary(member, project["damages"], project["project_name"], project["drive_folder_url"],
+                                project["damage_totals"])
+        with zf.open(BUNDLE_REPORT_DIR + name + "_Summary.pdf", "w") as member:
+            write_legal_summary_pdf(member, project["damages"], project["project_name"],
+                                    project["drive_folder_url"], project["damage_totals"])
+        with zf.open(BUNDLE_REPORT_DIR + name + "_Data.csv", "w") as member:
+            with io.TextIOWrapper(member, encoding="utf-8", newline="") as text:
+                damages_frame(project["damages"]).to_csv(text, index=False)
+
+
+def load_project_bundle(fileobj, on_newer=None):
+    # Reads the project file from the bundle and opens the project, then
+    # restores each receipt under the id the damage entries refer to. The
+    # receipts are only stored once the project has its id, so their rows
+    # don't end up under the project that was open before.
+    with zipfile.ZipFile(fileobj) as zf:
+        if not report_project_errors(check_bundle_members(zf.infolist())):
+            return False
+        if BUNDLE_PROJECT_FILE not in zf.namelist():
+            return report_project_errors(["Bundle does not contain " + BUNDLE_PROJECT_FILE])
+        with zf.open(BUNDLE_PROJECT_FILE) as member:
+            project, errors = read_project_file(member)
+        if not report_project_errors(errors) or not settle_newer_copy(fileobj, project, on_newer):
+            return False
         
-        lines.append("")
-        lines.append("SUBTOTAL: " + format_currency(cat_total))
+        apply_project(project)
+        for info in zf.infolist():
+            if not info.filename.startswith(BUNDLE_RECEIPT_DIR) or info.is_dir():
+                continue
+            receipt_id = info.filename[len(BUNDLE_RECEIPT_DIR):]
+            original_name = receipt_id.split("_", 1)[-1]
+            with zf.open(info) as member:
+                store_receipt(member, original_name, receipt_id)
+    recount_receipt_refs()
+    return True
+
+
+def check_bundle_members(infos):
+    # Guards against zip bombs. Reads never return more than a member's
+    # recorded file_size, so checking the directory is enough.
+    errors = []
+    if len(infos) > BUNDLE_MAX_MEMBERS:
+        errors.append("Bundle contains " + str(len(infos)) + " files, the limit is " + str(BUNDLE_MAX_MEMBERS))
+    unpacked = sum(info.file_size for info in infos)
+    if unpacked > BUNDLE_MAX_BYTES:
+        errors.append("Bundle unpacks to " + format_file_size(unpacked) + ", the limit is " +
+                      format_file_size(BUNDLE_MAX_BYTES))
+    return errors
+
+
+def read_import_chunks(fileobj):
+    # Yields DataFrames of at most IMPORT_CHUNK_ROWS rows from a CSV or XLSX
+    # file, with the header names mapped onto the entry fields
+    fileobj.seek(0)
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        wb = load_workbook(fileobj, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = [str(h) if h is not None else "" for h in next(rows, ())]
+            chunk = []
+            for row in rows:
+                if any(v is not None and str(v).strip() for v in row):
+                    chunk.append(row[:len(header)])
+                if len(chunk) == IMPORT_CHUNK_ROWS:
+                    yield import_columns(pd.DataFrame(chunk, columns=header, dtype=object))
+                    chunk = []
+            if chunk or not header:
+                yield import_columns(pd.DataFrame(chunk, columns=header, dtype=object))
+        finally:
+            wb.close()
+    else:
+        fileobj.seek(0)
+        reader = pd.read_csv(fileobj, dtype=str, keep_default_na=False, encoding="utf-8-sig",
+                             skip_blank_lines=True, chunksize=IMPORT_CHUNK_ROWS)
+        for chunk in reader:
+            yield import_columns(chunk)
+
+
+def import_columns(df):
+    renamed = {}
+    for col in df.columns:
+        field = IMPORT_COLUMNS.get(str(col).strip().lower())
+        if field and field not in renamed.values():
+            renamed[col] = field
+    return df[list(renamed)].rename(columns=renamed)
+
+
+def import_field(df, field):
+    # Optional columns that the file does not have read as empty
+    if field in df.columns:
+        return df[field].fillna("").astype(str).str.strip()
+    return pd.Series("", index=df.index, dtype=object)
+
+
+def validate_import_chunk(df, first_row):
+    # Column-wise version of validate_damage for spreadsheet rows. Returns the
+    # valid entries and one message per bad row ("Row N: ...", counting the
+    # header as row 1)
+    rows = pd.Series(np.arange(first_row, first_row + len(df)), index=df.index).astype(str)
+    text = {}
+    for field in ("Title", "Description", "Category", "Subcategory", "Receipt", "Link"):
+        text[field] = import_field(df, field)
+    raw_date = import_field(df, "Date")
+    raw_cost = import_field(df, "Cost")
     
-    lines.append("")
-    lines. append("-" * 80)
-    lines.append("III.  CHRONOLOGICAL LIST")
-    lines. append("-" * 80)
-    lines.append("")
+    dates = pd.to_datetime(raw_date.where(raw_date != ""), format="ISO8601", errors="coerce")
+    retry = dates.isna() & (raw_date != "")
+    if retry.any():
+        dates[retry] = pd.to_datetime(raw_date[retry], format="mixed", errors="coerce")
+    costs = pd.to_numeric(raw_cost.str.replace(r"[$,\s]", "", regex=True), errors="coerce")
     
-    running = 0
-    for idx, row in damages_df.sort_values('Date'). iterrows():
-        running = running + row['Cost']
-        lines.append(str(row['Date']) + " | " + row['Title'][:30] + " | " + 
-                    format_currency(row['Cost']) + " | Running: " + format_currency(running))
+    problems = [
+        (text["Title"] == "", "Title is missing"),
+        (text["Category"] == "", "Category is missing"),
+        (raw_date == "", "Date is missing"),
+        (dates.isna(), "Date '" + raw_date + "' is not a valid date"),
+        (raw_cost == "", "Cost is missing"),
+        (costs.isna(), "Cost '" + raw_cost + "' is not a number"),
+        (~np.isfinite(costs.fillna(0)) | (costs <= 0), "Cost '" + raw_cost + "' is not a valid amount")
+    ]
+    message = pd.Series("", index=df.index)
+    for mask, problem in problems:
+        message = message.mask((message == "") & mask, problem)
+    bad = message != ""
+    errors = ("Row " + rows[bad] + ": " + message[bad]).tolist()
     
-    lines.append("")
-    lines.append("-" * 80)
-    lines.append("IV. RECEIPT STATUS")
-    lines.append("-" * 80)
-    lines.append("")
-    lines.append("Total Items: " + str(len(damages_df)))
-    lines.append("With Receipts: " + str(len(damages_df[damages_df['Receipt'] != ''])))
-    lines.append("Missing Receipts: " + str(len(damages_df[damages_df['Receipt'] == ''])))
-    lines.append("Receipt Location: " + st. session_state.get('drive_folder_url', 'Not configured'))
-    lines. append("")
-    lines.append("-" * 80)
-    lines.append("V. GRAND TOTAL")
-    lines.append("-" * 80)
-    lines.append("")
-    lines.append("+------------------------------------------+")
-    lines.append("|                                          |")
-    lines.append("|   TOTAL DAMAGES: " + format_currency(total). rjust(20) + "   |")
-    lines.append("|                                          |")
-    lines.append("+------------------------------------------+")
-    lines.append("")
-    lines.append("=" * 80)
-    lines.append("END OF REPORT")
-    lines.append("=" * 80)
+    good = ~bad
+    pairs = pd.Series(list(zip(text["Category"][good], text["Subcategory"][good])), index=df.index[good], dtype=object)
+    triples = {pair: import_category(*pair) for pair in set(pairs)}
+    labels = {pair: category_label(*triple) for pair, triple in triples.items()}
+    known = st.session_state["uploaded_files_data"]
+    entries = pd.DataFrame({
+        "Title": text["Title"][good],
+        "Description": text["Description"][good],
+        "Date": dates[good].dt.strftime("%Y-%m-%d"),
+        "Category": pairs.map(labels),
+        "Taxonomy": pairs.map(triples),
+        "Cost": costs[good].astype(float),
+        "Receipt": text["Receipt"][good].where(text["Receipt"][good].isin(list(known)), ""),
+        "Link": text["Link"][good]
+    }).to_dict("records")
+    return entries, errors
+
+
+def import_category(category, subcategory):
+    # Maps a spreadsheet category onto a normalized triple: existing labels
+    # (such as those in the app's own CSV export), top-level names with an
+    # optional subcategory column, or a bare subcategory name. Anything else
+    # becomes a custom category.
+    tops = {}
+    lookup = {}
+    for top in CATEGORY_LIST:
+        tops[top.lower()] = top
+        lookup[top.lower()] = (top, "", "")
+        for sub in SUBCATEGORIES.get(top, []):
+            if sub != "Other":
+                lookup[(top + " - " + sub).lower()] = (top, sub, "")
+                lookup.setdefault(sub.lower(), (top, sub, ""))
     
-    return "\n".join(lines)
+    top = tops.get(category.lower())
+    if top and subcategory:
+        return normalize_category(top, "Other" if subcategory.lower() == "other" else subcategory, "")
+    if category.lower() in lookup:
+        return lookup[category.lower()]
+    return parse_category_label(category)
+
+
+def file_hash(fileobj):
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    chunk = fileobj.read(UPLOAD_CHUNK_SIZE)
+    while chunk:
+        digest.update(chunk)
+        chunk = fileobj.read(UPLOAD_CHUNK_SIZE)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+@timed()
+def import_damage_file(fileobj, content_hash):
+    # All rows are validated before anything is added, so a file with errors
+    # imports nothing. Returns the number of entries added, or None on errors.
+    # The file's content hash is recorded with the entries so importing the
+    # same file again can be caught.
+    entries = []
+    errors = []
+    first_row = 2
+    try:
+        for chunk in read_import_chunks(fileobj):
+            missing = [field for field in IMPORT_REQUIRED_COLUMNS if field not in chunk.columns]
+            if missing:
+                report_project_errors(["Missing column: " + field for field in missing], "Nothing was imported")
+                return None
+            chunk_entries, chunk_errors = validate_import_chunk(chunk, first_row)
+            entries.extend(chunk_entries)
+            errors.extend(chunk_errors)
+            first_row = first_row + len(chunk)
+    except (ValueError, KeyError, zipfile.BadZipFile) as e:
+        report_project_errors(["Not a readable CSV or Excel file: " + str(e)], "Nothing was imported")
+        return None
+    if not report_project_errors(errors, "Nothing was imported"):
+        return None
+    if entries:
+        add_damage_entries(entries, (content_hash, getattr(fileobj, "name", "")))
+    return len(entries)
+
+
+@timed()
+def add_damage_entry(entry):
+    # The totals are fetched before the store changes: get_damage_totals
+    # rebuilds them when their count no longer matches the store
+    totals = get_damage_totals()
+    st.session_state["damage_row_ids"].append(db_add_damage(st.session_state["project_id"], entry))
+    st.session_state["damages"].append(entry)
+    add_to_totals(totals, st.session_state["damages"][-1])
+    if entry['Receipt']:
+        retain_receipt(entry['Receipt'])
+    mark_damages_changed()
+
+
+@timed()
+def add_damage_entries(entries, source=None):
+    # Bulk version of add_damage_entry: one database transaction and a single
+    # totals rebuild
+    st.session_state["damage_row_ids"].extend(db_add_damages(st.session_state["project_id"], entries, source))
+    st.session_state["damages"].extend(entries)
+    st.session_state["damage_totals"] = totals_from_frame(st.session_state["damages"].frame())
+    for entry in entries:
+        if entry['Receipt']:
+            retain_receipt(entry['Receipt'])
+    mark_damages_changed()
+
+
+@timed()
+def delete_damage_entries(indices):
+    # Batch delete: one pass over the list, and the totals are updated per
+    # removed entry
+    drop = set(i for i in indices if 0 <= i < len(st.session_state["damages"]))
+    if not drop:
+        return []
+    totals = get_damage_totals()
+    removed = [st.session_state["damages"][i] for i in sorted(drop)]
+    row_ids = st.session_state["damage_row_ids"]
+    db_delete_damages(st.session_state["project_id"], [row_ids[i] for i in drop])
+    st.session_state["damage_row_ids"] = [row_id for i, row_id in enumerate(row_ids) if i not in drop]
+    st.session_state["damages"].delete(drop)
+    for dmg in removed:
+        remove_from_totals(totals, dmg, st.session_state["damages"])
+        if dmg.get('Receipt'):
+            release_receipt(dmg['Receipt'])
+    mark_damages_changed()
+    return removed
+
+
+@timed()
+def filter_damage_indices(damages, text):
+    text = text.strip().lower()
+    if not text:
+        return list(range(len(damages)))
+    df = damages.frame()
+    hits = (df['Title'].str.lower().str.contains(text, regex=False) |
+            df['Category'].str.lower().str.contains(text, regex=False))
+    return np.flatnonzero(hits.to_numpy()).tolist()
+
+
+def mark_damages_changed():
+    # Any change to the damages list invalidates previously built exports
+    st.session_state["damages_version"] = st.session_state["damages_version"] + 1
+
+
+@timed()
+def reset_damage_totals():
+    # Used when the whole damages list is replaced (new or loaded project)
+    st.session_state["damage_totals"] = totals_from_frame(st.session_state["damages"].frame())
+    recount_receipt_refs()
+    mark_damages_changed()
+
+
+def get_damage_totals():
+    totals = st.session_state["damage_totals"]
+    if totals is None or totals["count"] != len(st.session_state["damages"]):
+        totals = totals_from_frame(st.session_state["damages"].frame())
+        st.session_state["damage_totals"] = totals
+    return totals
+
+
+def get_totals_snapshot():
+    # Copy of the totals for export builders, which read them in another
+    # thread while the script keeps updating the live totals in place. One
+    # copy per damages version is shared by all of them, none changes it.
+    cached = st.session_state["totals_snapshot"]
+    version = st.session_state["damages_version"]
+    if cached is None or cached[0] != version:
+        cached = (version, copy_totals(get_damage_totals()))
+        st.session_state["totals_snapshot"] = cached
+    return cached[1]
+
+
+@timed()
+def get_damage_groups(damages_df):
+    cached = st.session_state["damage_groups"]
+    version = st.session_state["damages_version"]
+    if cached is None or cached[0] != version:
+        cached = (version, group_damages(damages_df))
+        st.session_state["damage_groups"] = cached
+    return cached[1]
+
+
+def resolve_category(category, subcategory, custom):
+    # Normalizes the entry form fields into a (top, subcategory, custom) triple
+    if subcategory == SUBCATEGORY_PLACEHOLDER:
+        subcategory = ""
+    if subcategory != "Other" and category != "Other":
+        custom = ""
+    return normalize_category(category, subcategory, custom)
+
+
+def bundle_receipt_bytes(project):
+    # Receipts dominate the bundle size, so this is checked before offering it
+    referenced = set(dmg['Receipt'] for dmg in project["damages"] if dmg.get('Receipt'))
+    return sum(meta['size'] for receipt_id, meta in project["receipts"].items() if receipt_id in referenced)
+
+
+def build_bundle_export(project):
+    bundle = export_file(write_project_bundle, project)
+    if os.fstat(bundle.fileno()).st_size > BUNDLE_MAX_BYTES:
+        bundle.close()
+        raise ValueError("Bundle is larger than " + format_file_size(BUNDLE_MAX_BYTES))
+    return bundle
+
+
+def lazy_export(kind, builder, cached=True):
+    # Returns a callable for st.download_button so the file is only built when
+    # the user clicks. The result is cached until the damages or the project
+    # details change; large exports such as the bundle can opt out. The
+    # callable runs outside the script thread, so the session state it needs
+    # is captured here, the damages and totals as snapshots the script can
+    # keep changing underneath.
+    cache = st.session_state["export_cache"]
+    project = current_project()
+    project["damages"] = project["damages"].snapshot()
+    project["receipts"] = dict(st.session_state["uploaded_files_data"])
+    project["damage_totals"] = get_totals_snapshot()
+    key = (st.session_state["damages_version"], project["project_name"],
+           project["project_created_date"], project["drive_folder_url"])
+    # Builds are profiled as runs of their own since they happen after the
+    # rerun that drew the button has finished
+    profiled = st.session_state["profile_open_run"] is not None
+    trace_memory = st.session_state["profile_memory"] or memory_from_env()
+    history = st.session_state["profile_history"]
+    session = st.session_state["profile_session"]
+
+    def build():
+        if not profiled:
+            return builder(project)
+        run = begin_run("export " + kind, trace_memory)
+        try:
+            with span(kind):
+                return builder(project)
+        finally:
+            record_run(end_run(run), history, session)
+
+    def load():
+        if not cached:
+            return build()
+        entry = cache.get(kind)
+        if entry is None or entry[0] != key:
+            entry = (key, build())
+            cache[kind] = entry
+        if isinstance(entry[1], bytes):
+            return entry[1]
+        # Every download reads the cached file through its own handle
+        return open(entry[1].name, "rb")
+
+    return load
+
+
+def render_debug_panel():
+    # Sidebar view of the recorded runs: the stages of the latest one and
+    # per-stage statistics over the history
+    history = list(st.session_state["profile_history"])
+    with st.sidebar:
+        st.subheader("Profiling")
+        st.checkbox("Trace memory", key="profile_memory", help="Uses tracemalloc, which slows the app down")
+        if not history:
+            st.caption("No runs recorded yet")
+            return
+        last = history[-1]
+        st.caption("Last run: " + last["label"] + " (" + last["status"] + "), " +
+                   "{:.1f} ms".format(last["seconds"] * 1000))
+        if last["spans"]:
+            stages = pd.DataFrame(last["spans"])
+            stages['name'] = ["  " * depth + name for depth, name in zip(stages['depth'], stages['name'])]
+            st.dataframe(stages.drop(columns='depth').round(1), hide_index=True, use_container_width=True)
+        
+        st.caption("Last " + str(len(history)) + " runs")
+        rows = [dict(row, run=i) for i, record in enumerate(history) for row in record["spans"]]
+        if rows:
+            stats = pd.DataFrame(rows).groupby('name')['ms'].agg(['count', 'mean', 'max']).round(1)
+            st.dataframe(stats.sort_values('mean', ascending=False), use_container_width=True)
+        st.download_button("Download profile log", data=profile_lines(history),
+                           file_name="profile_" + st.session_state["profile_session"] + ".jsonl",
+                           mime="application/jsonl", use_container_width=True)
 
 
 # Main App
+restore_session_project()
 st.title("Damage Invoice Tracker")
-st. markdown("### Legal Proceedings Documentation System")
+st.markdown("### Legal Proceedings Documentation System")
 
 if not st.session_state["project_active"]:
     st.markdown("---")
-    st. header("Project Management")
+    st.header("Project Management")
     
-    tab1, tab2 = st.tabs(["Create New Project", "Load Existing Project"])
+    tab1, tab2, tab3 = st.tabs(["Create New Project", "Load Existing Project", "Saved Projects"])
     
     with tab1:
-        st. subheader("Start a New Project")
+        st.subheader("Start a New Project")
         new_name = st.text_input("Project Name *", placeholder="e.g., Smith vs. Johnson 2024")
         
         if st.button("Create Project", type="primary", use_container_width=True):
             if new_name:
-                st.session_state["project_name"] = new_name
-                st.session_state["project_created_date"] = datetime.now().strftime("%Y-%m-%d %H:%M")
-                st.session_state["project_active"] = True
-                st.session_state["damages"] = []
+                apply_project({
+                    "project_name": new_name,
+                    "project_created_date": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                    "drive_folder_url": st.session_state["drive_folder_url"],
+                    "damages": []
+                })
                 st.success("Project created!")
                 st.rerun()
             else:
@@ -409,21 +1208,57 @@ if not st.session_state["project_active"]:
     
     with tab2:
         st.subheader("Load Saved Project")
-        uploaded = st.file_uploader("Upload Project File (. json)", type=["json"])
+        uploaded = st.file_uploader("Upload Project File or Bundle (.jsonl, .json or .zip)",
+                                    type=["jsonl", "json", "zip"])
         
         if uploaded is not None:
-            if st.button("Load Project", type="primary", use_container_width=True):
-                if load_project_from_json(uploaded. read(). decode('utf-8')):
+            on_newer = None
+            load = st.button("Load Project", type="primary", use_container_width=True)
+            conflict = st.session_state["load_conflict"]
+            if not load and conflict is not None and conflict[0] == uploaded.file_id:
+                # Asks before a file overwrites newer edits of the stored project
+                st.warning("The saved copy of this project was changed on " + conflict[1] + ", after this file " +
+                           "was saved" + (" (" + conflict[2] + ")" if conflict[2] else "") +
+                           ". Replacing it loses those changes.")
+                l1, l2 = st.columns(2)
+                with l1:
+                    if st.button("Replace Saved Copy", use_container_width=True):
+                        load, on_newer = True, "replace"
+                with l2:
+                    if st.button("Load as New Copy", use_container_width=True):
+                        load, on_newer = True, "copy"
+            if load:
+                st.session_state["load_conflict"] = None
+                if load_project_file(uploaded, on_newer):
                     st.success("Project loaded!")
-                    st. rerun()
+                    st.rerun()
+                elif st.session_state["load_conflict"] is not None:
+                    st.rerun()
+    
+    with tab3:
+        st.subheader("Open a Saved Project")
+        saved = db_list_projects()
+        if saved:
+            labels = {}
+            for project_id, name, created, updated, count, total in saved:
+                labels[project_id] = (name + " - " + str(count) + " entries, " + format_currency(total) +
+                                      " (updated " + updated + ")")
+            chosen_id = st.selectbox("Project", list(labels), format_func=lambda pid: labels[pid])
+            if st.button("Open Project", type="primary", use_container_width=True):
+                open_saved_project(chosen_id)
+                st.rerun()
+        else:
+            st.info("No saved projects yet. Projects you create or load are saved here automatically.")
 
 else:
     # Project Header
-    total_dmg = sum(d['Cost'] for d in st.session_state['damages'])
+    with span("totals"):
+        totals = get_damage_totals()
+    total_dmg = totals["sum"]
     st.markdown(
         "<div style='background:linear-gradient(90deg,#1f4e79,#2e75b6);color:white;"
         "padding:1rem;border-radius:10px;margin-bottom:1rem;'>"
-        "<h3 style='margin:0;color:white;'>Project: " + st. session_state['project_name'] + "</h3>"
+        "<h3 style='margin:0;color:white;'>Project: " + st.session_state['project_name'] + "</h3>"
         "<p style='margin:0. 5rem 0 0 0;color:#e0e0e0;'>Entries: " + str(len(st.session_state['damages'])) +
         " | Total: " + format_currency(total_dmg) + "</p></div>",
         unsafe_allow_html=True
@@ -433,22 +1268,23 @@ else:
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        safe_name = st.session_state['project_name']. replace(' ', '_'). replace('/', '-')
+        safe_name = safe_project_name(st.session_state['project_name'])
         st.download_button(
-            "Save Project", data=save_project_to_json(),
-            file_name=safe_name + "_" + datetime.now(). strftime('%Y%m%d') + ".json",
-            mime="application/json", use_container_width=True
+            "Save Project", data=lazy_export("project", build_project_export),
+            file_name=safe_name + "_" + datetime.now().strftime('%Y%m%d') + ".jsonl",
+            mime="application/jsonl", use_container_width=True
         )
     
     with col2:
         if st.button("Switch Project", use_container_width=True):
             st.session_state["project_active"] = False
+            st.query_params.pop("project", None)
             st.rerun()
     
     with col3:
         btn_label = "Done Editing" if st.session_state["delete_mode"] else "Edit/Delete"
-        if st. button(btn_label, use_container_width=True):
-            st.session_state["delete_mode"] = not st. session_state["delete_mode"]
+        if st.button(btn_label, use_container_width=True):
+            st.session_state["delete_mode"] = not st.session_state["delete_mode"]
             st.rerun()
     
     # Google Drive Config
@@ -457,26 +1293,49 @@ else:
         if st.button("Save Config"):
             st.session_state["drive_folder_url"] = drive_url
             st.session_state["drive_folder_configured"] = True
-            st. success("Saved!")
+            db_update_drive_folder(st.session_state["project_id"], drive_url)
+            st.success("Saved!")
             st.rerun()
     
     # Delete Mode
     if st.session_state["delete_mode"]:
         st.markdown("---")
-        st.warning("**Edit Mode** - Click X to delete entries")
+        st.warning("**Edit Mode** - Tick entries and delete them together")
         
         if st.session_state["damages"]:
-            for idx, dmg in enumerate(st.session_state["damages"]):
-                c1, c2, c3, c4, c5 = st.columns([1, 2, 3, 2, 1])
-                c1.write("#" + str(idx + 1))
-                c2. write(dmg['Date'])
-                c3.write(dmg['Title'][:35])
-                c4.write(format_currency(dmg['Cost']))
-                if c5.button("X", key="del_" + str(idx)):
-                    delete_damage_entry(idx)
-                    st.rerun()
+            f1, f2 = st.columns([3, 1])
+            edit_filter = f1.text_input("Filter by title or category", key="edit_filter")
+            page_size = f2.selectbox("Per page", EDIT_PAGE_SIZES, key="edit_page_size")
+            
+            matches = filter_damage_indices(st.session_state["damages"], edit_filter)
+            page_count = max(1, -(-len(matches) // page_size))
+            if st.session_state.get("edit_page", 1) > page_count:
+                st.session_state["edit_page"] = page_count
+            page = st.number_input("Page (of " + str(page_count) + ")", min_value=1, max_value=page_count,
+                                   step=1, key="edit_page")
+            
+            # Only the visible page is turned into widgets
+            with span("edit grid"):
+                page_indices = matches[(page - 1) * page_size:page * page_size]
+                page_rows = st.session_state["damages"].frame().iloc[page_indices]
+                page_df = pd.DataFrame({
+                    "Delete": False, "#": [idx + 1 for idx in page_indices], "Date": page_rows['Date'].tolist(),
+                    "Title": page_rows['Title'].str[:35].tolist(), "Cost": format_currency_column(page_rows['Cost']).tolist()
+                }, index=page_indices, columns=["Delete", "#", "Date", "Title", "Cost"])
+                edited = st.data_editor(
+                    page_df, hide_index=True, use_container_width=True,
+                    disabled=["#", "Date", "Title", "Cost"],
+                    key="edit_grid_" + str(st.session_state["damages_version"]) + "_" + edit_filter +
+                        "_" + str(page_size) + "_" + str(page)
+                )
+            selected = edited.index[edited["Delete"]].tolist()
+            
+            st.caption("Showing " + str(len(page_indices)) + " of " + str(len(matches)) + " matching entries")
+            if st.button("Delete " + str(len(selected)) + " selected", type="primary", disabled=not selected):
+                delete_damage_entries(selected)
+                st.rerun()
         else:
-            st. info("No entries")
+            st.info("No entries")
     
     else:
         # Entry Form
@@ -492,25 +1351,25 @@ else:
                 
                 subcategory = ""
                 if category in SUBCATEGORIES:
-                    subcategory = st. selectbox("Subcategory", ["Select... "] + SUBCATEGORIES[category])
+                    subcategory = st.selectbox("Subcategory", [SUBCATEGORY_PLACEHOLDER] + SUBCATEGORIES[category])
                 
                 custom_cat = ""
                 if category == "Other" or subcategory == "Other":
-                    custom_cat = st. text_input("Specify:")
+                    custom_cat = st.text_input("Specify:")
             
             with c2:
                 date_val = st.date_input("Date *", value=datetime.today())
-                cost_val = st. number_input("Cost (USD) *", min_value=0.0, step=0.01, format="%.2f", value=0.0)
+                cost_val = st.number_input("Cost (USD) *", min_value=0.0, step=0.01, format="%.2f", value=0.0)
                 desc = st.text_area("Description", height=70)
             
-            img_file = st. file_uploader("Upload Receipt", type=["png", "jpg", "jpeg", "pdf"])
+            img_file = st.file_uploader("Upload Receipt", type=["png", "jpg", "jpeg", "pdf"])
             submitted = st.form_submit_button("Add Entry", type="primary", use_container_width=True)
         
         if submitted:
             if not title:
                 st.error("Please provide a title")
             elif cost_val <= 0:
-                st. error("Please enter a valid cost")
+                st.error("Please enter a valid cost")
             else:
                 fname = ""
                 flink = ""
@@ -520,76 +1379,124 @@ else:
                     if st.session_state["drive_folder_configured"]:
                         flink = generate_drive_link(st.session_state["drive_folder_url"], fname)
                 
-                if category == "Other":
-                    final_cat = custom_cat if custom_cat else "Other"
-                elif subcategory and subcategory not in ["Select...", "Other", ""]:
-                    final_cat = category + " - " + subcategory
-                elif subcategory == "Other" and custom_cat:
-                    final_cat = category + " - " + custom_cat
-                else:
-                    final_cat = category
+                cat_triple = resolve_category(category, subcategory, custom_cat)
+                final_cat = category_label(*cat_triple)
                 
-                st.session_state["damages"]. append({
+                add_damage_entry({
                     "Title": title,
                     "Description": desc,
-                    "Date": date_val. strftime("%Y-%m-%d"),
+                    "Date": date_val.strftime("%Y-%m-%d"),
                     "Category": final_cat,
+                    "Taxonomy": cat_triple,
                     "Cost": float(cost_val),
                     "Receipt": fname,
                     "Link": flink
                 })
                 st.success("Entry added!")
-                st. rerun()
+                st.rerun()
+        
+        # Bulk Import
+        with st.expander("Import Entries from CSV/Excel"):
+            st.caption("Needs Title, Date, Category and Cost columns; Description, Subcategory, "
+                       "Receipt and Link are optional. The app's own CSV export can be imported as is.")
+            import_file = st.file_uploader("Spreadsheet", type=["csv", "xlsx"], key="import_file")
+            import_hash = None
+            if import_file is not None and st.button("Import Entries", use_container_width=True):
+                content_hash = file_hash(import_file)
+                previous = db_find_import(st.session_state["project_id"], content_hash)
+                if previous is None:
+                    import_hash = content_hash
+                else:
+                    # Asks before adding the same rows a second time
+                    st.session_state["import_repeat"] = (st.session_state["project_id"], import_file.file_id,
+                                                         content_hash, previous)
+            repeat = st.session_state["import_repeat"]
+            if (import_file is not None and repeat is not None and
+                    repeat[:2] == (st.session_state["project_id"], import_file.file_id)):
+                st.warning("This file was already imported into the project on " + repeat[3][2] + " (" +
+                           str(repeat[3][1]) + " entries). Importing it again adds its entries a second time.")
+                if st.button("Import Again", use_container_width=True):
+                    import_hash = repeat[2]
+            if import_hash is not None:
+                st.session_state["import_repeat"] = None
+                imported = import_damage_file(import_file, import_hash)
+                if imported:
+                    st.success("Imported " + str(imported) + " entries!")
+                    st.rerun()
+                elif imported == 0:
+                    st.warning("No rows found in the file")
     
     # Summary
     st.markdown("---")
     st.header("Damage Summary")
     
     if st.session_state["damages"]:
-        df = pd.DataFrame(st.session_state["damages"])
-        total_cost = df["Cost"].sum()
+        with span("summary frame"):
+            df = st.session_state["damages"].frame()
+        total_cost = totals["sum"]
         
         # Metrics
         m1, m2, m3, m4 = st.columns(4)
         m1.metric("TOTAL", format_currency(total_cost))
-        m2.metric("Items", len(df))
-        m3.metric("Average", format_currency(df['Cost'].mean()))
-        m4.metric("Categories", df["Category"].nunique())
+        m2.metric("Items", totals["count"])
+        m3.metric("Average", format_currency(total_cost / totals["count"]))
+        m4.metric("Categories", len(totals["categories"]))
         
         # Category Breakdown
+        st.markdown("### By Top-Level Category")
+        with span("top-level breakdown"):
+            top_totals = rollup_totals(totals)
+            st.dataframe(pd.DataFrame(
+                [{"Category": top, "Items": top_totals[top]["count"], "Total": format_currency(top_totals[top]["sum"]),
+                  "Share": "{:.1f}%".format(top_totals[top]["sum"] / total_cost * 100 if total_cost > 0 else 0)}
+                 for top in sorted(top_totals)]
+            ), hide_index=True, use_container_width=True)
+        
         st.markdown("### By Category")
-        for cat in sorted(df['Category'].unique()):
-            cat_df = df[df['Category'] == cat]
-            cat_sum = cat_df['Cost'].sum()
-            pct = (cat_sum / total_cost * 100) if total_cost > 0 else 0
+        with span("category breakdown"):
+            for cat, cat_df in get_damage_groups(df).items():
+                cat_stats = totals["categories"][cat]
+                cat_sum = cat_stats["sum"]
+                pct = (cat_sum / total_cost * 100) if total_cost > 0 else 0
             
-            with st.expander(cat + " - " + format_currency(cat_sum) + " ({:.1f}%)".format(pct)):
-                st.write("**Total:** " + format_currency(cat_sum))
-                st. write("**Items:** " + str(len(cat_df)))
-                for idx, item in cat_df. iterrows():
-                    rec = " [Receipt]" if item['Receipt'] else ""
-                    st.write("- " + item['Date'] + " - " + item['Title'] + ": " + format_currency(item['Cost']) + rec)
+                with st.expander(cat + " - " + format_currency(cat_sum) + " ({:.1f}%)".format(pct)):
+                    st.write("**Total:** " + format_currency(cat_sum))
+                    st.write("**Items:** " + str(cat_stats["count"]))
+                    rec = pd.Series(" [Receipt]", index=cat_df.index).where(cat_df['Receipt'].astype(bool), "")
+                    st.write("\n".join(("- " + cat_df['Date'] + " - " + cat_df['Title'] + ": " +
+                                        format_currency_column(cat_df['Cost']) + rec).tolist()))
+        
+        # Timeline, drawn from the per-period totals
+        st.markdown("### Damages Over Time")
+        t1, t2 = st.columns(2)
+        timeline_period = t1.radio("Period", ["Month", "Week"], horizontal=True, key="timeline_period")
+        timeline_split = t2.radio("Split by", list(TIMELINE_SPLITS), horizontal=True, key="timeline_split")
+        with span("timeline"):
+            timeline = period_frame(totals, timeline_period.lower(), TIMELINE_SPLITS[timeline_split])
+            st.bar_chart(timeline, y_label="Amount ($)")
+            with st.expander("Table"):
+                st.dataframe(timeline.assign(Total=timeline.sum(axis=1)).round(2), use_container_width=True)
         
         # Grand Total
-        st. markdown("---")
-        st. markdown(
+        st.markdown("---")
+        st.markdown(
             "<div style='background:#d4edda;padding:1. 5rem;border-radius:10px;border:2px solid #28a745;text-align:center;'>"
             "<h2 style='color:#155724;margin:0;'>GRAND TOTAL</h2>"
             "<h1 style='color:#155724;font-size:3rem;margin:0. 5rem 0;'>" + format_currency(total_cost) + "</h1>"
-            "<p style='color:#155724;'>" + str(len(df)) + " items in " + str(df['Category']. nunique()) + " categories</p></div>",
+            "<p style='color:#155724;'>" + str(totals["count"]) + " items in " + str(len(totals["categories"])) + " categories</p></div>",
             unsafe_allow_html=True
         )
         
         # Export
         st.markdown("---")
-        st. markdown("### Export for Attorney")
-        e1, e2, e3 = st.columns(3)
+        st.markdown("### Export for Attorney")
+        e1, e2, e3, e4, e5 = st.columns(5)
         
-        safe_name = st. session_state['project_name'].replace(' ', '_').replace('/', '-')
+        safe_name = safe_project_name(st.session_state['project_name'])
         
         with e1:
-            st. download_button(
-                "Excel Report", data=create_excel_report(df, st.session_state["project_name"]),
+            st.download_button(
+                "Excel Report", data=lazy_export("excel", build_excel_export),
                 file_name=safe_name + "_Report.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 use_container_width=True
@@ -597,26 +1504,111 @@ else:
         
         with e2:
             st.download_button(
-                "Legal Summary", data=create_legal_summary(df, st.session_state["project_name"]),
+                "Legal Summary", data=lazy_export("summary", build_summary_export),
                 file_name=safe_name + "_Summary.txt", mime="text/plain", use_container_width=True
             )
         
         with e3:
             st.download_button(
-                "CSV Data", data=df.to_csv(index=False). encode('utf-8'),
+                "Summary PDF", data=lazy_export("summary_pdf", build_summary_pdf_export),
+                file_name=safe_name + "_Summary.pdf", mime="application/pdf", use_container_width=True
+            )
+        
+        with e4:
+            st.download_button(
+                "CSV Data", data=lazy_export("csv", build_csv_export),
                 file_name=safe_name + "_Data.csv", mime="text/csv", use_container_width=True
             )
         
+        with e5:
+            receipt_bytes = bundle_receipt_bytes({"damages": st.session_state["damages"],
+                                                  "receipts": st.session_state["uploaded_files_data"]})
+            if receipt_bytes > BUNDLE_MAX_BYTES:
+                st.button("Full Bundle", disabled=True, use_container_width=True,
+                          help="Receipts total " + format_file_size(receipt_bytes) + ", more than the " +
+                          format_file_size(BUNDLE_MAX_BYTES) + " bundle limit")
+            else:
+                st.download_button(
+                    "Full Bundle", data=lazy_export("bundle", build_bundle_export, cached=False),
+                    file_name=safe_name + "_Bundle.zip", mime="application/zip", use_container_width=True
+                )
+        
         # Table View
-        st. markdown("---")
+        st.markdown("---")
         st.subheader("All Entries")
-        show_df = df.copy()
-        show_df['Cost'] = show_df['Cost'].apply(format_currency)
-        show_df['Receipt'] = show_df['Receipt'].apply(lambda x: 'Yes' if x else 'No')
-        st.dataframe(show_df[['Date', 'Category', 'Title', 'Cost', 'Receipt']], use_container_width=True)
+        f1, f2 = st.columns([3, 1])
+        search_text = f1.text_input("Search title and description", key="search_text")
+        receipt_filter = f2.selectbox("Receipt", list(RECEIPT_FILTERS), key="search_receipt")
+        f3, f4, f5, f6 = st.columns(4)
+        date_from = f3.date_input("From", value=None, key="search_date_from")
+        date_to = f4.date_input("To", value=None, key="search_date_to")
+        cost_min = f5.number_input("Min cost ($)", min_value=0.0, value=None, step=10.0, format="%.2f",
+                                   key="search_cost_min")
+        cost_max = f6.number_input("Max cost ($)", min_value=0.0, value=None, step=10.0, format="%.2f",
+                                   key="search_cost_max")
+        category_options = sorted(totals["categories"])
+        # Categories whose last entry was deleted drop out of the selection
+        st.session_state["search_categories"] = [
+            cat for cat in st.session_state.get("search_categories", []) if cat in totals["categories"]
+        ]
+        search_categories = st.multiselect("Categories", category_options, key="search_categories")
+        
+        # Answered from the store's search index instead of rescanning the entries
+        with span("entry search"):
+            positions = st.session_state["damages"].search(
+                search_text, date_from, date_to, cost_min, cost_max,
+                search_categories or None, RECEIPT_FILTERS[receipt_filter]
+            )
+        with span("all entries table"):
+            show_df = df.take(positions)
+            show_df['Cost'] = format_currency_column(show_df['Cost'])
+            show_df['Receipt'] = show_df['Receipt'].apply(lambda x: 'Yes' if x else 'No')
+            st.dataframe(show_df[['Date', 'Category', 'Title', 'Cost', 'Receipt']], use_container_width=True)
+        if len(positions) < len(df):
+            st.caption("Showing " + str(len(positions)) + " of " + str(len(df)) + " entries, totalling " +
+                       format_currency(df['Cost'].to_numpy()[positions].sum()))
+        
+        # Receipt Files
+        stored = list(st.session_state["uploaded_files_data"])
+        if stored:
+            with st.expander("Receipt Files (" + str(len(stored)) + ")"):
+                collect_receipt_jobs()
+                chosen = st.selectbox("Receipt", stored)
+                meta = st.session_state["uploaded_files_data"][chosen]
+                path = receipt_path(chosen)
+                if meta.get('thumbnail') and os.path.exists(meta['thumbnail']):
+                    st.image(meta['thumbnail'])
+                    if meta.get('archive'):
+                        st.caption("Uploaded " + format_file_size(meta['size']) +
+                                   ", compressed copy " + format_file_size(meta['archive_size']))
+                    else:
+                        st.caption("Uploaded " + format_file_size(meta['size']))
+                elif chosen in st.session_state["receipt_jobs"]:
+                    st.caption("Preparing preview...")
+                if os.path.exists(path):
+                    st.download_button(
+                        "Download " + meta['original_name'], data=receipt_reader(path),
+                        file_name=meta['original_name'], use_container_width=True
+                    )
+                    if meta.get('archive') and os.path.exists(meta['archive']):
+                        st.download_button(
+                            "Download compressed copy", data=receipt_reader(meta['archive']),
+                            file_name=os.path.splitext(meta['original_name'])[0] +
+                            os.path.splitext(meta['archive'])[1],
+                            key="archive_download", use_container_width=True
+                        )
+                else:
+                    st.warning("Receipt file is no longer available on the server")
     
     else:
         st.info("No damages recorded.  Add your first entry above.")
 
 st.markdown("---")
 st.caption("Damage Invoice Tracker v4.0")
+
+if st.session_state["profile_open_run"] is not None:
+    run = st.session_state["profile_open_run"]
+    st.session_state["profile_open_run"] = None
+    record_run(end_run(run), st.session_state["profile_history"], st.session_state["profile_session"])
+    if debug_panel:
+        render_debug_panel()
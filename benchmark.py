@@ -0,0 +1,231 @@
+# Benchmarks report generation and the summary rerun for synthetic claims of
+# increasing size. Runs headless (the builders come from the Streamlit-free
+# reporting module and the rerun uses Streamlit's AppTest, so no server is
+# started) and can write the results as JSON so later runs can be compared
+# against them.
+#
+#   python benchmark.py --sizes 100 10000 100000 --output bench.json
+#   python benchmark.py --baseline bench.json     # exits with 1 on a regression
+
+import argparse
+import ast
+import gc
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import reporting
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(APP_DIR, "app.py")
+DEFAULT_SIZES = [100, 10000, 100000]
+# Differences below this are treated as noise when comparing to a baseline
+MIN_REGRESSION_SECONDS = 0.005
+
+
+def load_app():
+    # Executes only the imports, constants, functions and classes of app.py,
+    # skipping page setup, session state initialization and the UI. Needed
+    # for the project database functions, which live in the app.
+    with open(APP_PATH) as f:
+        tree = ast.parse(f.read())
+    body = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef)):
+            body.append(node)
+        elif isinstance(node, ast.Assign) and all(isinstance(t, ast.Name) and t.id.isupper() for t in node.targets):
+            body.append(node)
+    app = {"__name__": "app", "__file__": APP_PATH}
+    exec(compile(ast.Module(body=body, type_ignores=[]), APP_PATH, "exec"), app)
+    return app
+
+
+def make_claim(items, categories=20, receipt_ratio=0.6, seed=0):
+    # Synthetic project with the given number of entries spread over
+    # `categories` category labels (predefined ones first, then custom ones)
+    rng = random.Random(seed)
+    labels = []
+    for top in reporting.CATEGORY_LIST:
+        labels.append(top)
+        for sub in reporting.SUBCATEGORIES.get(top, []):
+            if sub != "Other":
+                labels.append(top + " - " + sub)
+    labels = labels[:categories]
+    while len(labels) < categories:
+        labels.append("Custom category " + str(len(labels) + 1))
+
+    start = date(2023, 1, 1)
+    damages = []
+    for i in range(items):
+        receipt = ""
+        if rng.random() < receipt_ratio:
+            receipt = "%016x_receipt_%d.pdf" % (rng.getrandbits(64), i)
+        damages.append({
+            "Title": "Expense " + str(i + 1),
+            "Description": "Synthetic entry " + str(i + 1) + " for benchmarking",
+            "Date": (start + timedelta(days=rng.randrange(730))).isoformat(),
+            "Category": rng.choice(labels),
+            "Cost": round(rng.lognormvariate(4, 1.2), 2),
+            "Receipt": receipt,
+            "Link": ""
+        })
+    return {
+        "project_name": "Benchmark " + str(items),
+        "project_created_date": "2024-01-01 09:00",
+        "drive_folder_url": "https://drive.google.com/drive/folders/benchmark",
+        "damages": damages
+    }
+
+
+def measure(fn, repeat):
+    # Timings come from runs without tracemalloc (it slows allocation-heavy
+    # code down); peak memory from one extra traced run
+    runs = []
+    for _ in range(repeat):
+        gc.collect()
+        t = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(runs), "median_seconds": statistics.median(runs), "runs": runs,
+            "peak_mb": round(peak / 1e6, 2)}
+
+
+def bench_builders(claim, repeat):
+    store = reporting.DamageStore(claim["damages"])
+    df = store.frame()
+    project = dict(claim, damages=store, receipts={}, damage_totals=reporting.totals_from_frame(df))
+    saved = reporting.build_project_export(project)
+
+    cases = [
+        ("store", lambda: reporting.DamageStore(claim["damages"]).frame()),
+        ("totals", lambda: reporting.totals_from_frame(df)),
+        ("groups", lambda: reporting.group_damages(df)),
+        ("excel_report", lambda: reporting.build_excel_export(project)),
+        ("legal_summary", lambda: reporting.build_summary_export(project)),
+        ("summary_pdf", lambda: reporting.build_summary_pdf_export(project)),
+        ("csv_export", lambda: reporting.build_csv_export(project)),
+        ("project_save", lambda: reporting.build_project_export(project)),
+        ("project_load", lambda: reporting.read_project_file(io.BytesIO(saved)))
+    ]
+    results = []
+    for name, fn in cases:
+        results.append(dict(measure(fn, repeat), case=name))
+    return results
+
+
+def bench_rerun(app, claim, repeat, workdir):
+    # The claim is stored in a project database next to a copy of app.py, so
+    # the app under test opens it through the Saved Projects tab exactly as a
+    # user would and nothing touches the real projects.db or uploads folder
+    from streamlit.testing.v1 import AppTest
+
+    project_id = app["db_create_project"](claim)[0]
+    at = AppTest.from_file(os.path.join(workdir, "app.py"), default_timeout=600)
+    at.run()
+    at.selectbox[0].select(project_id)
+
+    def open_project():
+        [b for b in at.button if b.label == "Open Project"][0].click().run()
+
+    t = time.perf_counter()
+    open_project()
+    opened = time.perf_counter() - t
+    if at.exception:
+        raise RuntimeError("App raised: " + str(at.exception[0].value))
+    if [m.value for m in at.metric if m.label == "Items"] != [str(len(claim["damages"]))]:
+        raise RuntimeError("The benchmark project did not open in the app")
+    result = dict(measure(at.run, repeat), case="summary_rerun")
+    result["open_seconds"] = opened
+    return [result]
+
+
+def compare(results, baseline, tolerance):
+    previous = {}
+    for row in baseline["results"]:
+        previous[(row["items"], row["case"])] = row["seconds"]
+    regressions = []
+    for row in results:
+        before = previous.get((row["items"], row["case"]))
+        if before is None:
+            continue
+        if row["seconds"] > before * tolerance and row["seconds"] - before > MIN_REGRESSION_SECONDS:
+            regressions.append(row["case"] + " @ " + str(row["items"]) + ": " +
+                               "{:.3f}s -> {:.3f}s".format(before, row["seconds"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark report generation for synthetic claims")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="claim sizes (entries)")
+    parser.add_argument("--categories", type=int, default=20, help="distinct category labels per claim")
+    parser.add_argument("--receipt-ratio", type=float, default=0.6, help="share of entries with a receipt")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case (the fastest is reported)")
+    parser.add_argument("--skip-rerun", action="store_true", help="skip the AppTest summary rerun")
+    parser.add_argument("--output", help="write results as JSON to this file ('-' for stdout)")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="slowdown factor over the baseline that counts as a regression")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="damage-bench-")
+    try:
+        for name in ("app.py", "reporting.py", "instrumentation.py"):
+            shutil.copy(os.path.join(APP_DIR, name), os.path.join(workdir, name))
+        app = load_app()
+        app["PROJECT_DB_PATH"] = os.path.join(workdir, "projects.db")
+
+        results = []
+        for items in args.sizes:
+            claim = make_claim(items, args.categories, args.receipt_ratio, args.seed)
+            rows = bench_builders(claim, args.repeat)
+            if not args.skip_rerun:
+                rows.extend(bench_rerun(app, claim, args.repeat, workdir))
+            for row in rows:
+                row["items"] = items
+                print("{:>8} {:<15} {:>9.3f}s {:>9.1f} MB".format(items, row["case"], row["seconds"],
+                                                                 row["peak_mb"]), file=sys.stderr)
+            results.extend(rows)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"sizes": args.sizes, "categories": args.categories, "receipt_ratio": args.receipt_ratio,
+                   "seed": args.seed, "repeat": args.repeat},
+        "results": results
+    }
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+    elif args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print("REGRESSION " + line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# Timing spans for the app's reruns and exports. A run is opened per rerun
+# (or per export build) and every span entered while it is open records its
+# latency and, when memory tracing is on, the memory it allocated. Without an
+# open run spans do nothing, so the instrumented code pays nothing when
+# profiling is off. Streamlit-free so the reporting core can use it too.
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# Last reruns kept per session for the debug panel
+PROFILE_HISTORY = 20
+# Appends every finished run as one JSON line when set
+PROFILE_LOG_ENV = "DAMAGE_PROFILE_LOG"
+PROFILE_MEMORY_ENV = "DAMAGE_PROFILE_MEMORY"
+
+CURRENT_RUN = contextvars.ContextVar("current_run", default=None)
+LOG_LOCK = threading.Lock()
+TRACE_LOCK = threading.Lock()
+TRACE_STATE = {"users": 0, "started": False}
+
+
+def new_profile_history():
+    return deque(maxlen=PROFILE_HISTORY)
+
+
+def acquire_tracing():
+    # tracemalloc is process-wide, so it is reference counted across the
+    # sessions and export threads using it and only stopped by the last one.
+    # Tracing that was on before the app started it is left alone.
+    with TRACE_LOCK:
+        if TRACE_STATE["users"] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            TRACE_STATE["started"] = True
+        TRACE_STATE["users"] = TRACE_STATE["users"] + 1
+
+
+def release_tracing():
+    with TRACE_LOCK:
+        TRACE_STATE["users"] = TRACE_STATE["users"] - 1
+        if TRACE_STATE["users"] == 0 and TRACE_STATE["started"]:
+            tracemalloc.stop()
+            TRACE_STATE["started"] = False
+
+
+def begin_run(label, trace_memory=False):
+    # Opens a run in the current thread and returns it; pass it to end_run.
+    # Memory tracing (tracemalloc) slows everything down, so it is only on
+    # for the runs that ask for it, and only while one of their outermost
+    # spans is open. A run that is cut short never leaves tracing on.
+    run = {
+        "label": label,
+        "started": datetime.now().isoformat(timespec="milliseconds"),
+        "status": "ok",
+        "seconds": None,
+        "spans": [],
+        "trace_memory": bool(trace_memory),
+        "stack": [],
+        "clock": time.perf_counter(),
+        "token": None
+    }
+    run["token"] = CURRENT_RUN.set(run)
+    return run
+
+
+def end_run(run, status=None):
+    # Closes the run and returns its record (label, status, total seconds
+    # and one row per span in the order the spans finished)
+    run["seconds"] = time.perf_counter() - run["clock"]
+    if status:
+        run["status"] = status
+    if CURRENT_RUN.get() is run:
+        CURRENT_RUN.reset(run["token"])
+    record = {}
+    for key in ("label", "started", "status", "seconds", "spans"):
+        record[key] = run[key]
+    return record
+
+
+@contextmanager
+def span(name):
+    run = CURRENT_RUN.get()
+    if run is None:
+        yield
+        return
+
+    frame = {"name": name, "depth": len(run["stack"]), "base": 0, "peak": 0}
+    outermost = run["trace_memory"] and not run["stack"]
+    if outermost:
+        acquire_tracing()
+    if run["trace_memory"]:
+        # The tracemalloc peak is process-wide, so it is folded into the
+        # enclosing span before being reset for this one
+        current, peak = tracemalloc.get_traced_memory()
+        if run["stack"]:
+            run["stack"][-1]["peak"] = max(run["stack"][-1]["peak"], peak)
+        tracemalloc.reset_peak()
+        frame["base"] = current
+        frame["peak"] = current
+    run["stack"].append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        row = {"name": name, "depth": frame["depth"], "ms": (time.perf_counter() - start) * 1000}
+        run["stack"].pop()
+        if run["trace_memory"]:
+            current, peak = tracemalloc.get_traced_memory()
+            frame["peak"] = max(frame["peak"], peak)
+            if run["stack"]:
+                run["stack"][-1]["peak"] = max(run["stack"][-1]["peak"], frame["peak"])
+            row["peak_kb"] = (frame["peak"] - frame["base"]) / 1024
+            row["alloc_kb"] = (current - frame["base"]) / 1024
+        if outermost:
+            release_tracing()
+        run["spans"].append(row)
+
+
+def timed(name=None):
+    # Decorator form of span; the span is named after the function by default
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def log_path():
+    return os.environ.get(PROFILE_LOG_ENV, "")
+
+
+def memory_from_env():
+    return os.environ.get(PROFILE_MEMORY_ENV, "") not in ("", "0")
+
+
+def record_run(record, history=None, session=""):
+    # Keeps the record for the debug panel and appends it to the structured
+    # log when one is configured
+    if history is not None:
+        history.append(record)
+    path = log_path()
+    if path:
+        line = json.dumps(dict(record, session=session), separators=(',', ':'))
+        with LOG_LOCK, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def profile_lines(history):
+    # The session's records as JSON Lines, for download
+    return "".join(json.dumps(record, separators=(',', ':')) + "\n" for record in history).encode("utf-8")
@@ -0,0 +1,333 @@
+# Load test: simulates concurrent users of the app and reports rerun latency
+# percentiles and how much memory each session holds. Every user drives its
+# own copy of the app through Streamlit's AppTest (no server or browser):
+# it creates a project, optionally imports a batch of entries, adds entries
+# through the form (some with a receipt image) and downloads exports.
+#
+#   python loadtest.py --users 8 --entries 30 --preload 5000 --output load.json
+#
+# All users share one process, like sessions on one Streamlit server, so
+# cached resources, the project database and the receipt store are shared
+# too. AppTest swaps process-wide globals while it runs a script, so script
+# runs are serialized; a user's latency includes waiting for the runs of the
+# others, as reruns competing for one server process do. Exports run
+# outside that lock, the way download requests run beside reruns.
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from benchmark import make_claim
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_FILES = ("app.py", "reporting.py", "instrumentation.py")
+EXPORT_LABELS = ("Excel Report", "Legal Summary", "CSV Data")
+RECEIPT_IMAGE_SIZE = (640, 480)
+PERCENTILES = (50, 90, 99)
+
+RUN_LOCK = threading.Lock()
+# Download callables registered by the script run in progress, by the file id
+# their button carries; see capture_exports
+DEFERRED_EXPORTS = {}
+
+
+def capture_exports():
+    # A download button's callable only reaches the server's media file
+    # manager, which AppTest throws away after each run. Remembering every
+    # registered callable lets a user "click" a download the way the
+    # browser's request would, outside the script run.
+    from streamlit.runtime.media_file_manager import MediaFileManager
+
+    add_deferred = MediaFileManager.add_deferred
+
+    def recording(self, data_callable, *args, **kwargs):
+        file_id = add_deferred(self, data_callable, *args, **kwargs)
+        DEFERRED_EXPORTS[file_id] = data_callable
+        return file_id
+
+    MediaFileManager.add_deferred = recording
+    return lambda: setattr(MediaFileManager, "add_deferred", add_deferred)
+
+
+def deep_size(value, seen=None):
+    # Bytes held by value and everything it references, counting each object
+    # once. Objects shared between sessions (interned strings, the category
+    # index) are counted in every session that holds them.
+    if seen is None:
+        seen = set()
+    if id(value) in seen or callable(value) or isinstance(value, type):
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        size = sys.getsizeof(value) if value.base is None else value.nbytes
+        if value.dtype == object:
+            size = size + sum(deep_size(item, seen) for item in value.ravel().tolist())
+        return size
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size = size + sum(deep_size(k, seen) + deep_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)) or type(value).__name__ == "deque":
+        size = size + sum(deep_size(item, seen) for item in value)
+    elif hasattr(value, "__dict__"):
+        size = size + deep_size(vars(value), seen)
+    return size
+
+
+def session_memory(at):
+    # Size of each session_state key of a user's session, largest first
+    sizes = {}
+    for key, value in at.session_state.items():
+        sizes[key] = deep_size(value)
+    return dict(sorted(sizes.items(), key=lambda item: -item[1]))
+
+
+def process_rss():
+    # Current resident set size in bytes (Linux), else the peak
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def receipt_image(rng):
+    # Noise compresses badly, so the app's thumbnail and archive work is
+    # close to that of a real photo of a receipt
+    width, height = RECEIPT_IMAGE_SIZE
+    img = Image.frombytes("RGB", RECEIPT_IMAGE_SIZE, rng.randbytes(width * height * 3))
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+
+def claim_csv(items, seed):
+    out = io.StringIO()
+    pd.DataFrame(make_claim(items, seed=seed)["damages"]).to_csv(out, index=False)
+    return out.getvalue().encode("utf-8")
+
+
+def button(at, label):
+    return [b for b in at.button if b.label == label][0]
+
+
+class User:
+    # One simulated user; timings are (action, seconds including the wait
+    # for other users' runs, seconds spent running)
+
+    def __init__(self, number, args, app_path):
+        from streamlit.testing.v1 import AppTest
+
+        self.number = number
+        self.args = args
+        self.rng = random.Random(args.seed * 1000 + number)
+        self.at = AppTest.from_file(app_path, default_timeout=args.timeout)
+        self.timings = []
+        self.errors = []
+        self.exports = {}
+
+    def run(self, action, step):
+        start = time.perf_counter()
+        with RUN_LOCK:
+            running = time.perf_counter()
+            DEFERRED_EXPORTS.clear()
+            step()
+            done = time.perf_counter()
+            # Only the buttons of the latest run can be clicked
+            self.exports = dict(DEFERRED_EXPORTS)
+            DEFERRED_EXPORTS.clear()
+        self.timings.append((action, done - start, done - running))
+        if self.at.exception:
+            self.errors.append(action + ": " + str(self.at.exception[0].value))
+
+    def think(self):
+        if self.args.think > 0:
+            time.sleep(self.rng.uniform(0, 2 * self.args.think))
+
+    def create_project(self):
+        self.run("open app", self.at.run)
+        self.at.text_input[0].input("Load test user " + str(self.number))
+        self.run("create project", button(self.at, "Create Project").click().run)
+
+    def preload(self, items):
+        uploader = [u for u in self.at.get("file_uploader") if u.label == "Spreadsheet"][0]
+        uploader.set_value(("claim.csv", claim_csv(items, self.number), "text/csv"))
+        self.run("upload spreadsheet", self.at.run)
+        self.run("import entries", button(self.at, "Import Entries").click().run)
+
+    def add_entry(self, index):
+        at = self.at
+        [t for t in at.text_input if t.label == "Title *"][0].input("Load entry " + str(index + 1))
+        [n for n in at.number_input if n.label == "Cost (USD) *"][0].set_value(round(self.rng.uniform(5, 900), 2))
+        [t for t in at.text_area if t.label == "Description"][0].input("Added by load test user " + str(self.number))
+        action = "add entry"
+        if self.args.receipt_every and (index + 1) % self.args.receipt_every == 0:
+            receipt = [u for u in at.get("file_uploader") if u.label == "Upload Receipt"][0]
+            receipt.set_value(("receipt_" + str(index + 1) + ".png", receipt_image(self.rng), "image/png"))
+            action = "add entry + receipt"
+        self.run(action, button(at, "Add Entry").click().run)
+
+    def export(self):
+        downloads = dict((b.label, b.proto.deferred_file_id) for b in self.at.get("download_button"))
+        for label in EXPORT_LABELS:
+            build = self.exports.get(downloads.get(label))
+            if build is None:
+                self.errors.append("export: no " + label + " button")
+                continue
+            start = time.perf_counter()
+            try:
+                build()
+            except Exception as e:
+                self.errors.append("export " + label + ": " + repr(e))
+            elapsed = time.perf_counter() - start
+            self.timings.append(("export " + label, elapsed, elapsed))
+
+    def session(self):
+        self.create_project()
+        if self.args.preload:
+            self.think()
+            self.preload(self.args.preload)
+        for index in range(self.args.entries):
+            self.think()
+            self.add_entry(index)
+            if self.args.export_every and (index + 1) % self.args.export_every == 0:
+                self.export()
+        self.run("rerun", self.at.run)
+        return self
+
+
+def percentiles(values):
+    values = sorted(values)
+    result = {}
+    for p in PERCENTILES:
+        rank = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+        result["p" + str(p)] = values[rank]
+    result["max"] = values[-1]
+    result["mean"] = statistics.fmean(values)
+    return result
+
+
+def summarize(users, elapsed):
+    by_action = {}
+    for user in users:
+        for action, latency, service in user.timings:
+            entry = by_action.setdefault(action, {"latency": [], "service": []})
+            entry["latency"].append(latency)
+            entry["service"].append(service)
+    actions = []
+    for action, entry in by_action.items():
+        actions.append(dict(action=action, count=len(entry["latency"]), latency=percentiles(entry["latency"]),
+                            service=percentiles(entry["service"])))
+    actions.sort(key=lambda row: -row["latency"]["p50"])
+
+    sessions = []
+    for user in users:
+        sizes = session_memory(user.at)
+        sessions.append({"user": user.number, "entries": len(user.at.session_state["damages"]),
+                         "bytes": sum(sizes.values()), "largest_keys": dict(list(sizes.items())[:5]),
+                         "errors": user.errors})
+    return {
+        "elapsed_seconds": elapsed,
+        "runs": sum(row["count"] for row in actions),
+        "actions": actions,
+        "sessions": sessions,
+        "session_bytes_total": sum(s["bytes"] for s in sessions)
+    }
+
+
+def print_report(report):
+    print("{:<28} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+        "action", "runs", "p50 ms", "p90 ms", "p99 ms", "max ms", "run p50"), file=sys.stderr)
+    for row in report["actions"]:
+        latency = row["latency"]
+        print("{:<28} {:>6} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f}".format(
+            row["action"], row["count"], latency["p50"] * 1000, latency["p90"] * 1000, latency["p99"] * 1000,
+            latency["max"] * 1000, row["service"]["p50"] * 1000), file=sys.stderr)
+    sizes = [s["bytes"] for s in report["sessions"]]
+    print("", file=sys.stderr)
+    print("sessions: {}  per session: min {:.2f} MB, mean {:.2f} MB, max {:.2f} MB, total {:.2f} MB".format(
+        len(sizes), min(sizes) / 1e6, statistics.fmean(sizes) / 1e6, max(sizes) / 1e6,
+        report["session_bytes_total"] / 1e6), file=sys.stderr)
+    print("process RSS: {:.1f} MB before, {:.1f} MB after; {} runs in {:.1f}s".format(
+        report["rss_before"] / 1e6, report["rss_after"] / 1e6, report["runs"], report["elapsed_seconds"]),
+        file=sys.stderr)
+    for session in report["sessions"]:
+        for error in session["errors"]:
+            print("ERROR user " + str(session["user"]) + ": " + error, file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the app with concurrent simulated users")
+    parser.add_argument("--users", type=int, default=4, help="concurrent users")
+    parser.add_argument("--entries", type=int, default=20, help="entries each user adds through the form")
+    parser.add_argument("--preload", type=int, default=0, help="entries each user imports from a CSV first")
+    parser.add_argument("--receipt-every", type=int, default=5,
+                        help="attach a receipt image to every Nth entry (0 for none)")
+    parser.add_argument("--export-every", type=int, default=10,
+                        help="download the exports after every Nth entry (0 for none)")
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause between a user's actions (s)")
+    parser.add_argument("--ramp", type=float, default=0.0, help="spread user start times over this many seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=600, help="timeout for a single script run (s)")
+    parser.add_argument("--output", help="write the report as JSON to this file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="damage-load-")
+    restore = capture_exports()
+    try:
+        for name in APP_FILES:
+            shutil.copy(os.path.join(APP_DIR, name), os.path.join(workdir, name))
+        app_path = os.path.join(workdir, "app.py")
+        gc.collect()
+        rss_before = process_rss()
+
+        def start(number):
+            if args.ramp > 0:
+                time.sleep(args.ramp * number / args.users)
+            return User(number, args, app_path).session()
+
+        began = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            users = list(pool.map(start, range(1, args.users + 1)))
+        elapsed = time.perf_counter() - began
+        gc.collect()
+        report = summarize(users, elapsed)
+        report["rss_before"] = rss_before
+        report["rss_after"] = process_rss()
+    finally:
+        restore()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report["python"] = platform.python_version()
+    report["platform"] = platform.platform()
+    report["params"] = vars(args)
+    print_report(report)
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+    elif args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if any(s["errors"] for s in report["sessions"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1640 @@
+# Streamlit-free core of the Damage Invoice Tracker: the category taxonomy,
+# the damage store, totals, project files and the Excel / legal summary /
+# CSV reports. Everything takes explicit inputs so it can be used from the
+# app, from batch jobs and from the command line:
+#
+#   python reporting.py claims/ --out-dir reports/ --workers 8
+
+import argparse
+import bisect
+import functools
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import time
+import weakref
+from array import array
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+
+from instrumentation import span, timed
+
+CATEGORY_LIST = [
+    "Property Damage",
+    "Economic/Financial Loss",
+    "Medical & Health-Related",
+    "Emotional & Psychological Damages",
+    "Loss of Companionship or Consortium",
+    "Punitive Damages",
+    "Special Circumstances",
+    "Legal & Administrative Costs",
+    "Future Damages",
+    "Miscellaneous",
+    "Other"
+]
+SUBCATEGORIES = {
+    "Property Damage": [
+        "Vehicle repair/replacement", "Rental vehicle costs",
+        "Damage to home or real estate", "Damage to personal belongings", "Other"
+    ],
+    "Economic/Financial Loss": [
+        "Lost wages or income", "Loss of earning capacity", "Business interruption",
+        "Out-of-pocket expenses", "Replacement costs", "Other"
+    ],
+    "Medical & Health-Related": [
+        "Medical bills", "Medication costs", "Rehabilitation or physical therapy",
+        "Mental health therapy", "Other"
+    ],
+    "Emotional & Psychological Damages": [
+        "Pain and suffering", "Emotional distress", "Loss of enjoyment of life",
+        "Grief and bereavement", "Other"
+    ],
+    "Special Circumstances": [
+        "Pet loss and related costs", "Temporary housing costs",
+        "Childcare expenses", "Travel expenses", "Other"
+    ],
+    "Legal & Administrative Costs": [
+        "Attorney fees", "Court filing fees", "Expert witness fees", "Other"
+    ],
+    "Future Damages": [
+        "Projected medical care", "Future therapy", "Long-term disability costs", "Other"
+    ]
+}
+PROJECT_FORMAT = "damage-invoice-project"
+# 2: entries carry their category triple as "Taxonomy"
+# 3: entries with a "Taxonomy" leave out the "Category" label
+PROJECT_FORMAT_VERSION = 3
+PROJECT_FIELDS = ("project_name", "project_created_date", "drive_folder_url")
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+SEARCH_TOKEN_PATTERN = re.compile(r"\w+")
+# Time buckets kept in the totals: months as "YYYY-MM", weeks as the date of
+# their Monday
+PERIODS = ("month", "week")
+CURRENCY_FORMAT = '"$"#,##0.00'
+# Zero-padded text of every thousands group and every cents value, picked by
+# position when a whole column of amounts is formatted
+THOUSANDS_TEXT = pd.array([str(i).zfill(3) for i in range(1000)], dtype="str")
+CENTS_TEXT = pd.array([str(i).zfill(2) for i in range(100)], dtype="str")
+PERCENT_FORMAT = '0.0%'
+SUMMARY_CHUNK_ROWS = 5000
+PDF_PAGE_SIZE = (612, 792)  # US Letter, in points
+PDF_MARGIN = 54
+PDF_FONT_SIZE = 8
+PDF_LINE_HEIGHT = 10
+PDF_LINE_CHARS = 100
+# Labels whose triple is remembered by category_triple
+CATEGORY_CACHE_SIZE = 4096
+JSON_DECODER = json.JSONDecoder()
+
+
+def register_category(index, triple):
+    index["ids"][triple] = len(index["triples"])
+    index["labels"].append(category_label(*triple))
+    index["triples"].append(triple)
+    return index["ids"][triple]
+
+
+def normalize_category(top, sub="", custom=""):
+    # The canonical (top-level category, subcategory, custom label) triple.
+    # Unknown top-level names become custom "Other" categories, a custom
+    # label that names a predefined subcategory becomes that subcategory and
+    # custom labels only hang off top-level "Other" or an "Other" subcategory,
+    # so every category has exactly one triple and one label.
+    top = (top or "").strip()
+    sub = (sub or "").strip()
+    custom = (custom or "").strip()
+    if top not in CATEGORY_LIST:
+        return ("Other", "", custom or (sub if sub != "Other" else "") or top)
+    if top == "Other":
+        return ("Other", "", custom or (sub if sub != "Other" else ""))
+    subs = [s for s in SUBCATEGORIES.get(top, []) if s != "Other"]
+    if sub and sub != "Other" and sub not in subs:
+        custom = custom or sub
+        sub = "Other"
+    if sub == "Other" or (custom and not sub):
+        for predefined in subs:
+            if predefined.lower() == custom.lower():
+                return (top, predefined, "")
+        return (top, "Other", custom) if custom else (top, "", "")
+    return (top, sub, "")
+
+
+def category_label(top, sub, custom):
+    # The display string of a normalized triple, e.g. "Property Damage -
+    # Vehicle repair/replacement" or "Other - Roof repair". Distinct triples
+    # always get distinct labels; parse_category_label reverses it.
+    if top == "Other":
+        return "Other - " + custom if custom else "Other"
+    if sub == "Other":
+        return top + " - " + custom
+    if sub:
+        return top + " - " + sub
+    return top
+
+
+def parse_category_label(label):
+    # Triple of a label. Only needed for data that carries labels alone
+    # (older project files and databases, spreadsheets, report frames).
+    label = label.strip()
+    if label.startswith("Other - "):
+        return normalize_category("Other", "", label[len("Other - "):])
+    for top in CATEGORY_LIST:
+        if label == top:
+            return (top, "", "")
+        if label.startswith(top + " - "):
+            return normalize_category(top, "Other", label[len(top) + 3:])
+    return normalize_category("Other", "", label)
+
+
+@functools.lru_cache(maxsize=CATEGORY_CACHE_SIZE)
+def category_triple(label):
+    return parse_category_label(label)
+
+
+def build_category_index():
+    # The predefined taxonomy, keyed by triple. Every DamageStore starts its
+    # own category table from a copy of it, so the codes of predefined
+    # categories are the same everywhere and custom categories live and die
+    # with the store that uses them.
+    index = {"ids": {}, "labels": [], "triples": []}
+    for top in CATEGORY_LIST:
+        register_category(index, (top, "", ""))
+        for sub in SUBCATEGORIES.get(top, []):
+            if sub != "Other":
+                register_category(index, (top, sub, ""))
+    return index
+
+
+CATEGORY_INDEX = build_category_index()
+
+
+def get_category_index():
+    return CATEGORY_INDEX
+
+
+def entry_triple(dmg):
+    # Entries carry their triple as "Taxonomy"; bare labels are parsed
+    taxonomy = dmg.get('Taxonomy')
+    if taxonomy:
+        return normalize_category(*taxonomy)
+    return category_triple(dmg['Category'])
+
+
+def rollup_totals(totals, level="top"):
+    # Rolls the per-category totals up to top-level categories ("top") or
+    # (top-level, subcategory) pairs ("subcategory"). Labels map to a single
+    # triple, so the cost depends on the number of categories, not entries.
+    rolled = {}
+    for label, stats in totals["categories"].items():
+        top, sub, custom = category_triple(label)
+        key = top if level == "top" else (top, sub)
+        bucket = rolled.get(key)
+        if bucket is None:
+            bucket = {"count": 0, "sum": 0.0, "cents": 0}
+            rolled[key] = bucket
+        bucket["count"] = bucket["count"] + stats["count"]
+        bucket["cents"] = bucket["cents"] + stats["cents"]
+        bucket["sum"] = bucket["cents"] / 100
+    return rolled
+
+
+class DamageStore:
+    # Columnar storage for damage entries. Costs, dates and category ids are
+    # typed numpy arrays that grow by doubling, text fields are object arrays
+    # and categories are codes into the store's own category table (the
+    # predefined taxonomy plus the custom categories in use). It behaves like the
+    # list of entry dicts it replaces (len, iteration, indexing, append, pop)
+    # and frame() returns a DataFrame built from views of the arrays, cached
+    # until the next change.
+
+    TEXT_COLUMNS = ("Title", "Description", "Receipt", "Link")
+
+    def __init__(self, entries=()):
+        self._size = 0
+        # Stable ids, increasing in storage order; the search index refers to
+        # entries by id so deletions don't invalidate it
+        self._ids = np.empty(0, dtype=np.int64)
+        self._next_id = 0
+        self._search = None
+        self._cost = np.empty(0, dtype=np.float64)
+        self._date = np.empty(0, dtype="datetime64[D]")
+        self._category = np.empty(0, dtype=np.int32)
+        self._categories = {"ids": dict(CATEGORY_INDEX["ids"]), "labels": list(CATEGORY_INDEX["labels"]),
+                            "triples": list(CATEGORY_INDEX["triples"])}
+        self._text = {}
+        for col in self.TEXT_COLUMNS:
+            self._text[col] = np.empty(0, dtype=object)
+        self._frame = None
+        self.extend(entries)
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index = index + self._size
+        if index < 0 or index >= self._size:
+            raise IndexError("damage index out of range")
+        code = self._category[index]
+        return {
+            "Title": self._text["Title"][index],
+            "Description": self._text["Description"][index],
+            "Date": str(self._date[index]),
+            "Category": self._categories["labels"][code],
+            "Taxonomy": self._categories["triples"][code],
+            "Cost": float(self._cost[index]),
+            "Receipt": self._text["Receipt"][index],
+            "Link": self._text["Link"][index]
+        }
+
+    def __iter__(self):
+        n = self._size
+        labels = self._categories["labels"]
+        triples = self._categories["triples"]
+        columns = zip(self._text["Title"][:n], self._text["Description"][:n],
+                      np.datetime_as_string(self._date[:n], unit="D").tolist(),
+                      self._category[:n].tolist(), self._cost[:n].tolist(),
+                      self._text["Receipt"][:n], self._text["Link"][:n])
+        for title, desc, date, code, cost, receipt, link in columns:
+            yield {"Title": title, "Description": desc, "Date": date, "Category": labels[code],
+                   "Taxonomy": triples[code], "Cost": cost, "Receipt": receipt, "Link": link}
+
+    def _reserve(self, needed):
+        capacity = len(self._cost)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 16)
+        self._ids = self._grown(self._ids, capacity)
+        self._cost = self._grown(self._cost, capacity)
+        self._date = self._grown(self._date, capacity)
+        self._category = self._grown(self._category, capacity)
+        for col in self.TEXT_COLUMNS:
+            self._text[col] = self._grown(self._text[col], capacity)
+
+    def _grown(self, values, capacity):
+        grown = np.empty(capacity, dtype=values.dtype)
+        grown[:self._size] = values[:self._size]
+        return grown
+
+    def append(self, entry):
+        self.extend([entry])
+
+    def extend(self, entries):
+        entries = list(entries)
+        if not entries:
+            return
+        start = self._size
+        end = start + len(entries)
+        self._reserve(end)
+        self._ids[start:end] = np.arange(self._next_id, self._next_id + len(entries))
+        self._next_id = self._next_id + len(entries)
+        self._cost[start:end] = [dmg['Cost'] for dmg in entries]
+        self._date[start:end] = np.array([dmg['Date'] for dmg in entries], dtype="datetime64[D]")
+        # Each distinct category is resolved once per call
+        codes = {}
+        keys = [tuple(dmg.get('Taxonomy') or ()) or dmg['Category'] for dmg in entries]
+        for key, dmg in zip(keys, entries):
+            if key not in codes:
+                triple = entry_triple(dmg)
+                code = self._categories["ids"].get(triple)
+                codes[key] = code if code is not None else register_category(self._categories, triple)
+        self._category[start:end] = [codes[key] for key in keys]
+        self._text["Title"][start:end] = [dmg['Title'] for dmg in entries]
+        self._text["Description"][start:end] = [dmg.get('Description', '') for dmg in entries]
+        self._text["Receipt"][start:end] = [sys.intern(dmg.get('Receipt', '')) for dmg in entries]
+        self._text["Link"][start:end] = [sys.intern(dmg.get('Link', '')) for dmg in entries]
+        self._size = end
+        self._frame = None
+        if self._search is not None:
+            self._search.add(self._ids[start:end], self._text["Title"][start:end],
+                             self._text["Description"][start:end], self._date[start:end], self._cost[start:end])
+
+    def pop(self, index):
+        entry = self[index]
+        self.delete([index % self._size])
+        return entry
+
+    def delete(self, indices):
+        # Compacts into fresh arrays so frames handed out earlier stay valid
+        keep = np.ones(self._size, dtype=bool)
+        keep[list(indices)] = False
+        if self._search is not None:
+            self._search.remove(self._ids[:self._size][~keep])
+        self._ids = self._ids[:self._size][keep]
+        self._cost = self._cost[:self._size][keep]
+        self._date = self._date[:self._size][keep]
+        self._category = self._category[:self._size][keep]
+        for col in self.TEXT_COLUMNS:
+            self._text[col] = self._text[col][:self._size][keep]
+        self._size = int(keep.sum())
+        self._frame = None
+        if self._search is not None and self._search.dead > self._size:
+            self._search = None
+
+    def snapshot(self):
+        # Read-only copy of the current entries for export builders running
+        # in other threads. It shares the arrays: later appends write past
+        # its end and deletes compact into fresh arrays, so its rows never
+        # change underneath it.
+        n = self._size
+        view = DamageStore()
+        view._size = n
+        view._ids = self._ids[:n]
+        view._next_id = self._next_id
+        view._cost = self._cost[:n]
+        view._date = self._date[:n]
+        view._category = self._category[:n]
+        view._categories = {"ids": dict(self._categories["ids"]), "labels": list(self._categories["labels"]),
+                            "triples": list(self._categories["triples"])}
+        for col in self.TEXT_COLUMNS:
+            view._text[col] = self._text[col][:n]
+        view._frame = self._frame
+        return view
+
+    def frame(self):
+        if self._frame is None:
+            with span("store frame"):
+                n = self._size
+                labels = np.array(self._categories["labels"], dtype=object)
+                self._frame = pd.DataFrame({
+                    "Title": self._text["Title"][:n],
+                    "Description": self._text["Description"][:n],
+                    "Date": np.datetime_as_string(self._date[:n], unit="D").astype(object),
+                    "Category": labels.take(self._category[:n]),
+                    "Cost": self._cost[:n],
+                    "Receipt": self._text["Receipt"][:n],
+                    "Link": self._text["Link"][:n]
+                }, copy=False)
+        return self._frame
+
+    def column_chunks(self, columns, positions=None):
+        # Lists of the given columns for the entries at `positions` (storage
+        # order by default), SUMMARY_CHUNK_ROWS entries at a time, so report
+        # writers can walk any order without a sorted or filtered copy
+        if positions is None:
+            positions = np.arange(self._size)
+        labels = self._categories["labels"]
+        for start in range(0, len(positions), SUMMARY_CHUNK_ROWS):
+            part = positions[start:start + SUMMARY_CHUNK_ROWS]
+            chunk = []
+            for col in columns:
+                if col == "Date":
+                    chunk.append(np.datetime_as_string(self._date.take(part), unit="D").tolist())
+                elif col == "Cost":
+                    chunk.append(self._cost.take(part).tolist())
+                elif col == "Category":
+                    chunk.append([labels[code] for code in self._category.take(part).tolist()])
+                else:
+                    chunk.append(self._text[col].take(part).tolist())
+            yield chunk
+
+    def rows(self, columns, positions=None):
+        for chunk in self.column_chunks(columns, positions):
+            for row in zip(*chunk):
+                yield row
+
+    def date_order(self):
+        # Positions in date order; entries on the same day keep their order
+        return np.argsort(self._date[:self._size], kind="stable")
+
+    def category_positions(self, order=None):
+        # Positions of each category's entries, categories sorted by label as
+        # in group_damages, entries in `order` (storage order by default)
+        if order is None:
+            order = np.arange(self._size)
+        codes = self._category.take(order)
+        grouping = np.argsort(codes, kind="stable")
+        used, starts = np.unique(codes.take(grouping), return_index=True)
+        parts = np.split(order.take(grouping), starts[1:])
+        labels = self._categories["labels"]
+        return dict(sorted(zip([labels[code] for code in used.tolist()], parts), key=lambda item: item[0]))
+
+    def missing_receipt_positions(self):
+        return np.flatnonzero(self._text["Receipt"][:self._size] == "")
+
+    def search_index(self):
+        # Built on the first search, then kept up to date by extend/delete
+        if self._search is None:
+            with span("search index"):
+                n = self._size
+                self._search = DamageSearchIndex()
+                self._search.add(self._ids[:n], self._text["Title"][:n], self._text["Description"][:n],
+                                 self._date[:n], self._cost[:n])
+        return self._search
+
+    def search(self, text="", date_from=None, date_to=None, cost_min=None, cost_max=None,
+               categories=None, has_receipt=None):
+        # Positions (ascending) of the entries matching every given filter.
+        # Words in `text` must all occur in the title or description, each as
+        # a word or the start of one; dates are inclusive ISO strings or dates.
+        n = self._size
+        ids = None
+        if text.strip() or date_from or date_to or cost_min is not None or cost_max is not None:
+            index = self.search_index()
+            for token in search_tokens(text):
+                ids = index.matching(token, ids)
+            if date_from or date_to:
+                low = np.datetime64(date_from, "D") if date_from else None
+                high = np.datetime64(date_to, "D") if date_to else None
+                ids = index.in_range("date", low, high, ids)
+            if cost_min is not None or cost_max is not None:
+                ids = index.in_range("cost", cost_min, cost_max, ids)
+        if ids is None:
+            positions = np.arange(n)
+        else:
+            # Postings may still hold ids of deleted entries
+            positions = np.searchsorted(self._ids[:n], ids)
+            found = positions < n
+            positions = positions[found]
+            positions = positions[self._ids[positions] == ids[found]]
+        if categories is not None:
+            codes = [self._categories["ids"].get(category_triple(label)) for label in categories]
+            codes = [code for code in codes if code is not None]
+            positions = positions[np.isin(self._category[positions], codes)]
+        if has_receipt is not None:
+            positions = positions[(self._text["Receipt"][positions] != "") == has_receipt]
+        return positions
+
+
+def search_tokens(text):
+    return SEARCH_TOKEN_PATTERN.findall(text.lower())
+
+
+class DamageSearchIndex:
+    # Inverted index from lowercased words of the title and description to
+    # entry ids, plus every id ordered by date and by cost for range queries.
+    # Deleted ids leave the orders right away but stay in the postings until
+    # the store decides to rebuild the index.
+
+    def __init__(self):
+        self.postings = {}
+        self.vocabulary = []
+        self.dead = 0
+        self.orders = {
+            "date": (np.empty(0, dtype="datetime64[D]"), np.empty(0, dtype=np.int64)),
+            "cost": (np.empty(0, dtype=np.float64), np.empty(0, dtype=np.int64))
+        }
+
+    def add(self, ids, titles, descriptions, dates, costs):
+        new_words = []
+        for entry_id, title, desc in zip(ids.tolist(), titles, descriptions):
+            for token in set(search_tokens(title + " " + desc)):
+                posting = self.postings.get(token)
+                if posting is None:
+                    posting = array("q")
+                    self.postings[token] = posting
+                    new_words.append(token)
+                posting.append(entry_id)
+        if new_words:
+            self.vocabulary = sorted(self.vocabulary + new_words)
+        for name, values in (("date", dates), ("cost", costs)):
+            order_values, order_ids = self.orders[name]
+            sort = np.argsort(values, kind="stable")
+            at = np.searchsorted(order_values, values[sort], side="right")
+            self.orders[name] = (np.insert(order_values, at, values[sort]), np.insert(order_ids, at, ids[sort]))
+
+    def remove(self, ids):
+        for name, (order_values, order_ids) in self.orders.items():
+            keep = ~np.isin(order_ids, ids)
+            self.orders[name] = (order_values[keep], order_ids[keep])
+        self.dead = self.dead + len(ids)
+
+    def matching(self, prefix, ids=None):
+        # Sorted ids with a word starting with `prefix`, narrowed to `ids`
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        stop = bisect.bisect_left(self.vocabulary, prefix + "\U0010ffff", start)
+        postings = [np.array(self.postings[word], dtype=np.int64) for word in self.vocabulary[start:stop]]
+        if not postings:
+            return np.empty(0, dtype=np.int64)
+        # A posting list is in id order; several need merging
+        hits = postings[0] if len(postings) == 1 else np.unique(np.concatenate(postings))
+        if ids is None:
+            return hits
+        return np.intersect1d(ids, hits, assume_unique=True)
+
+    def in_range(self, name, low=None, high=None, ids=None):
+        # Sorted ids whose date/cost lies within [low, high], narrowed to `ids`
+        order_values, order_ids = self.orders[name]
+        start = 0 if low is None else np.searchsorted(order_values, low, side="left")
+        stop = len(order_values) if high is None else np.searchsorted(order_values, high, side="right")
+        hits = np.sort(order_ids[start:stop])
+        if ids is None:
+            return hits
+        return np.intersect1d(ids, hits, assume_unique=True)
+
+
+def damages_frame(damages):
+    # DamageStore keeps its own cached frame; plain lists (e.g. straight from
+    # a project file) are converted
+    if hasattr(damages, "frame"):
+        return damages.frame()
+    return pd.DataFrame(damages)
+
+
+def build_damage_totals(damages):
+    # Sums are kept as integer cents ("cents", "receipt_cents", ...) so adding
+    # and removing entries never drifts; each "sum" is derived from them
+    totals = {
+        "count": 0, "sum": 0.0, "cents": 0, "min": None, "max": None,
+        "date_min": None, "date_max": None,
+        "receipt_count": 0, "receipt_sum": 0.0, "receipt_cents": 0,
+        "no_receipt_count": 0, "no_receipt_sum": 0.0, "no_receipt_cents": 0,
+        "categories": {},
+        "periods": {"month": {}, "week": {}}
+    }
+    for dmg in damages:
+        add_to_totals(totals, dmg)
+    return totals
+
+
+def to_cents(cost):
+    return int(round(cost * 100))
+
+
+def copy_totals(totals):
+    # Copy whose nested dicts stay unchanged while the original is updated
+    copied = dict(totals)
+    copied["categories"] = {label: dict(stats) for label, stats in totals["categories"].items()}
+    copied["periods"] = {}
+    for period, buckets in totals["periods"].items():
+        copied["periods"][period] = {key: {label: dict(stats) for label, stats in categories.items()}
+                                     for key, categories in buckets.items()}
+    return copied
+
+
+def add_to_totals(totals, dmg):
+    cost = dmg['Cost']
+    cents = to_cents(cost)
+    date = dmg['Date']
+    cat_stats = totals["categories"].get(dmg['Category'])
+    if cat_stats is None:
+        cat_stats = {"count": 0, "sum": 0.0, "cents": 0, "min": None, "max": None}
+        totals["categories"][dmg['Category']] = cat_stats
+
+    for stats in (totals, cat_stats):
+        stats["count"] = stats["count"] + 1
+        stats["cents"] = stats["cents"] + cents
+        stats["sum"] = stats["cents"] / 100
+        if stats["min"] is None or cost < stats["min"]:
+            stats["min"] = cost
+        if stats["max"] is None or cost > stats["max"]:
+            stats["max"] = cost
+
+    if totals["date_min"] is None or date < totals["date_min"]:
+        totals["date_min"] = date
+    if totals["date_max"] is None or date > totals["date_max"]:
+        totals["date_max"] = date
+
+    if dmg.get('Receipt', '') != '':
+        totals["receipt_count"] = totals["receipt_count"] + 1
+        totals["receipt_cents"] = totals["receipt_cents"] + cents
+        totals["receipt_sum"] = totals["receipt_cents"] / 100
+    else:
+        totals["no_receipt_count"] = totals["no_receipt_count"] + 1
+        totals["no_receipt_cents"] = totals["no_receipt_cents"] + cents
+        totals["no_receipt_sum"] = totals["no_receipt_cents"] / 100
+
+    for period in PERIODS:
+        buckets = totals["periods"][period].setdefault(period_key(date, period), {})
+        stats = buckets.get(dmg['Category'])
+        if stats is None:
+            stats = {"count": 0, "sum": 0.0, "cents": 0}
+            buckets[dmg['Category']] = stats
+        stats["count"] = stats["count"] + 1
+        stats["cents"] = stats["cents"] + cents
+        stats["sum"] = stats["cents"] / 100
+
+
+def remove_from_totals(totals, dmg, remaining):
+    # remaining is the damages store after removal. It is only scanned when
+    # the removed entry sat on a min/max boundary.
+    cost = dmg['Cost']
+    cents = to_cents(cost)
+    date = dmg['Date']
+    cat_name = dmg['Category']
+    cat_stats = totals["categories"][cat_name]
+
+    for stats in (totals, cat_stats):
+        stats["count"] = stats["count"] - 1
+        stats["cents"] = stats["cents"] - cents
+        stats["sum"] = stats["cents"] / 100
+
+    if dmg.get('Receipt', '') != '':
+        totals["receipt_count"] = totals["receipt_count"] - 1
+        totals["receipt_cents"] = totals["receipt_cents"] - cents
+        totals["receipt_sum"] = totals["receipt_cents"] / 100
+    else:
+        totals["no_receipt_count"] = totals["no_receipt_count"] - 1
+        totals["no_receipt_cents"] = totals["no_receipt_cents"] - cents
+        totals["no_receipt_sum"] = totals["no_receipt_cents"] / 100
+
+    for period in PERIODS:
+        key = period_key(date, period)
+        buckets = totals["periods"][period][key]
+        stats = buckets[cat_name]
+        stats["count"] = stats["count"] - 1
+        stats["cents"] = stats["cents"] - cents
+        stats["sum"] = stats["cents"] / 100
+        if stats["count"] == 0:
+            del buckets[cat_name]
+            if not buckets:
+                del totals["periods"][period][key]
+
+    if totals["count"] == 0:
+        totals.update(build_damage_totals([]))
+        return
+
+    if cat_stats["count"] == 0:
+        del totals["categories"][cat_name]
+    elif cost == cat_stats["min"] or cost == cat_stats["max"]:
+        remaining_df = damages_frame(remaining)
+        cat_costs = remaining_df['Cost'][remaining_df['Category'] == cat_name]
+        cat_stats["min"] = float(cat_costs.min())
+        cat_stats["max"] = float(cat_costs.max())
+
+    if cost == totals["min"] or cost == totals["max"]:
+        totals["min"] = min(c["min"] for c in totals["categories"].values())
+        totals["max"] = max(c["max"] for c in totals["categories"].values())
+
+    if date == totals["date_min"] or date == totals["date_max"]:
+        dates = damages_frame(remaining)['Date']
+        totals["date_min"] = dates.min()
+        totals["date_max"] = dates.max()
+
+
+@timed()
+def totals_from_frame(damages_df):
+    # Vectorized equivalent of build_damage_totals for callers that only have
+    # a DataFrame (e.g. reports generated outside the app session)
+    totals = build_damage_totals([])
+    if len(damages_df) == 0:
+        return totals
+    
+    costs = damages_df['Cost']
+    # Same rounding as to_cents, so a rebuild matches the incremental totals
+    cents = pd.Series(np.rint(costs.to_numpy(dtype=np.float64) * 100).astype(np.int64), index=damages_df.index)
+    has_receipt = damages_df['Receipt'] != ''
+    cat_stats = damages_df.assign(Cents=cents).groupby('Category', sort=False).agg(
+        count=('Cost', 'count'), min=('Cost', 'min'), max=('Cost', 'max'), cents=('Cents', 'sum'))
+    
+    totals["count"] = len(damages_df)
+    totals["cents"] = int(cents.sum())
+    totals["sum"] = totals["cents"] / 100
+    totals["min"] = float(costs.min())
+    totals["max"] = float(costs.max())
+    totals["date_min"] = damages_df['Date'].min()
+    totals["date_max"] = damages_df['Date'].max()
+    totals["receipt_count"] = int(has_receipt.sum())
+    totals["receipt_cents"] = int(cents[has_receipt].sum())
+    totals["receipt_sum"] = totals["receipt_cents"] / 100
+    totals["no_receipt_count"] = totals["count"] - totals["receipt_count"]
+    totals["no_receipt_cents"] = totals["cents"] - totals["receipt_cents"]
+    totals["no_receipt_sum"] = totals["no_receipt_cents"] / 100
+    totals["categories"] = {}
+    for label, count, low, high, cat_cents in zip(cat_stats.index, cat_stats['count'].tolist(), cat_stats['min'].tolist(),
+                                                  cat_stats['max'].tolist(), cat_stats['cents'].tolist()):
+        totals["categories"][label] = {"count": count, "sum": cat_cents / 100, "cents": cat_cents,
+                                       "min": low, "max": high}
+    totals["periods"] = period_totals(damages_df, cents.to_numpy())
+    return totals
+
+
+def period_key(date, period):
+    # Bucket of one "YYYY-MM-DD" date
+    if period == "month":
+        return date[:7]
+    day = datetime.strptime(date, "%Y-%m-%d")
+    return (day - timedelta(days=day.weekday())).strftime("%Y-%m-%d")
+
+
+def period_totals(damages_df, cents):
+    # Per-period, per-category count and sum for every period in PERIODS.
+    # Dates are parsed and categories factorized once; each (bucket,
+    # category) pair becomes one integer so the sums are a bincount, and
+    # only the distinct buckets are turned into strings.
+    days = damages_df['Date'].to_numpy().astype("datetime64[D]")
+    day_numbers = days.astype(np.int64)
+    codes, labels = pd.factorize(damages_df['Category'])
+    labels = list(labels)
+    buckets = {
+        "month": (days.astype("datetime64[M]").astype(np.int64), "datetime64[M]"),
+        # 1970-01-01 was a Thursday
+        "week": (day_numbers - (day_numbers + 3) % 7, "datetime64[D]")
+    }
+    periods = {}
+    for period in PERIODS:
+        numbers, unit = buckets[period]
+        pairs, inverse = np.unique(numbers * len(labels) + codes, return_inverse=True)
+        counts = np.bincount(inverse).tolist()
+        # Float weights are exact for integer cents below 2**53
+        sums = np.bincount(inverse, weights=cents).astype(np.int64).tolist()
+        starts = pairs // len(labels)
+        keys = np.datetime_as_string(starts.astype(unit)).tolist()
+        result = {}
+        for key, code, count, total in zip(keys, (pairs % len(labels)).tolist(), counts, sums):
+            result.setdefault(key, {})[labels[code]] = {"count": count, "sum": total / 100, "cents": total}
+        periods[period] = result
+    return periods
+
+
+def period_frame(totals, period="month", level="top", value="sum"):
+    # Period (rows, oldest first, no gaps) by category (columns) table of the
+    # period totals. level is "top" for top-level categories, "category" for
+    # full labels or None for a single "Total" column. Works off the
+    # aggregates only, never the entries.
+    rows = {}
+    for key, categories in totals["periods"][period].items():
+        row = rows.setdefault(key, {})
+        for label, stats in categories.items():
+            if level == "top":
+                column = category_triple(label)[0]
+            elif level == "category":
+                column = label
+            else:
+                column = "Total"
+            row[column] = row.get(column, 0) + stats[value]
+    if not rows:
+        return pd.DataFrame()
+    frame = pd.DataFrame.from_dict(rows, orient="index").fillna(0)
+    frame = frame[sorted(frame.columns)]
+    if period == "month":
+        full = pd.period_range(min(rows), max(rows), freq="M").strftime("%Y-%m")
+    else:
+        full = pd.date_range(min(rows), max(rows), freq="7D").strftime("%Y-%m-%d")
+    frame = frame.reindex(full, fill_value=0)
+    frame.index.name = period.capitalize()
+    return frame
+
+
+@timed()
+def group_damages(damages_df):
+    # Single groupby pass shared by the report sheets, the legal summary and
+    # the category view. Categories come back sorted, items in entry order.
+    if len(damages_df) == 0:
+        return {}
+    return dict(iter(damages_df.groupby('Category', sort=True)))
+
+
+def safe_project_name(project_name):
+    return project_name.replace(' ', '_').replace('/', '-')
+
+
+@timed()
+def write_project_file(out, project):
+    # JSON Lines: a header object with the project details, then one compact
+    # object per damage entry
+    header = {"format": PROJECT_FORMAT, "version": PROJECT_FORMAT_VERSION}
+    for field in PROJECT_FIELDS:
+        header[field] = project[field]
+    # Stable identity, so loading a saved file updates the project it came from
+    if project.get("project_uuid"):
+        header["project_uuid"] = project["project_uuid"]
+    header["last_saved"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    out.write(json.dumps(header, separators=(',', ':')) + "\n")
+    for dmg in project["damages"]:
+        # The label is left out when the triple is there; reading rebuilds it
+        if dmg.get("Taxonomy"):
+            dmg = {k: v for k, v in dmg.items() if k != "Category"}
+        out.write(json.dumps(dmg, separators=(',', ':')) + "\n")
+
+
+@timed()
+def read_project_file(fileobj):
+    # Reads a binary project file and returns (project, errors). JSON Lines
+    # files are streamed line by line; older pretty-printed .json files are
+    # still accepted. Each damage is validated and coerced exactly once.
+    fileobj.seek(0)
+    try:
+        header = json.loads(fileobj.readline())
+    except ValueError:
+        header = None
+    
+    if isinstance(header, dict) and header.get("format") == PROJECT_FORMAT:
+        records = jsonl_records(fileobj, 2)
+        where = "Line "
+    else:
+        fileobj.seek(0)
+        try:
+            header = json.load(fileobj)
+        except ValueError as e:
+            return None, ["Not a valid project file: " + str(e)]
+        if not isinstance(header, dict):
+            return None, ["Not a valid project file: expected a JSON object"]
+        records = ((pos, record, None) for pos, record in enumerate(header.get("damages") or [], 1))
+        where = "Entry "
+    
+    project = {}
+    for field in PROJECT_FIELDS:
+        project[field] = str(header.get(field) or "")
+    project["project_uuid"] = str(header.get("project_uuid") or "")
+    # Compared with the project store's updated_at, so only kept in its format
+    project["last_saved"] = str(header.get("last_saved") or "")
+    try:
+        datetime.strptime(project["last_saved"], "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        project["last_saved"] = ""
+    
+    damages = []
+    errors = []
+    for pos, record, error in records:
+        if error is None:
+            entry, error = validate_damage(record)
+        if error is None:
+            damages.append(entry)
+        else:
+            errors.append(where + str(pos) + ": " + error)
+    project["damages"] = damages
+    return project, errors
+
+
+def jsonl_records(fileobj, first_line):
+    for line_no, raw in enumerate(fileobj, first_line):
+        if raw.strip():
+            yield parse_jsonl_line(line_no, raw)
+
+
+def parse_jsonl_line(line_no, raw):
+    # A line is accepted only if it holds exactly one JSON value. Calling
+    # raw_decode directly keeps the per-line overhead close to that of
+    # parsing many lines in one json.loads call.
+    try:
+        line = raw.decode("utf-8").strip(" \t\r\n")
+        record, end = JSON_DECODER.raw_decode(line)
+        if end == len(line):
+            return line_no, record, None
+    except ValueError:
+        pass
+    # Parsed again for json.loads' encoding detection and error message
+    try:
+        return line_no, json.loads(raw), None
+    except ValueError as e:
+        return line_no, None, "invalid JSON (" + str(e) + ")"
+
+
+def validate_damage(record):
+    # Returns (entry, None) with fields coerced to the types the app uses, or
+    # (None, message) describing the first problem found
+    if not isinstance(record, dict):
+        return None, "expected an object"
+    
+    title = record.get("Title")
+    if not isinstance(title, str) or not title.strip():
+        return None, "Title is missing"
+    taxonomy = record.get("Taxonomy")
+    if taxonomy is not None:
+        if not isinstance(taxonomy, list) or len(taxonomy) != 3 or not all(isinstance(t, str) for t in taxonomy):
+            return None, "Taxonomy must be a [category, subcategory, custom] list"
+        triple = normalize_category(*taxonomy)
+    else:
+        category = record.get("Category")
+        if not isinstance(category, str) or not category.strip():
+            return None, "Category is missing"
+        triple = category_triple(category)
+    
+    date = record.get("Date")
+    if not isinstance(date, str):
+        return None, "Date is missing"
+    try:
+        if not DATE_PATTERN.fullmatch(date):
+            raise ValueError
+        datetime.fromisoformat(date)
+    except ValueError:
+        return None, "Date '" + date + "' is not in YYYY-MM-DD format"
+    
+    cost = record.get("Cost")
+    if cost is None or isinstance(cost, bool):
+        return None, "Cost is missing"
+    try:
+        cost = float(cost)
+    except (TypeError, ValueError):
+        return None, "Cost " + repr(cost) + " is not a number"
+    if not math.isfinite(cost) or cost < 0:
+        return None, "Cost " + repr(record.get("Cost")) + " is not a valid amount"
+    
+    entry = {"Title": title, "Description": "", "Date": date, "Category": category_label(*triple),
+             "Taxonomy": triple, "Cost": cost, "Receipt": "", "Link": ""}
+    for field in ("Description", "Receipt", "Link"):
+        if record.get(field) is not None:
+            entry[field] = str(record[field])
+    return entry, None
+
+
+def format_currency(amount):
+    return "${:,.2f}".format(amount)
+
+
+def format_currency_column(amounts):
+    # Same text as format_currency for every amount, built with array
+    # operations instead of one format call per row
+    values = amounts.to_numpy(dtype=float, na_value=np.nan)
+    cents = np.abs(values) * 100
+    # Scaling by 100 can move an amount lying on a half cent (2.675 is stored
+    # as 2.67499...) to the wrong side of it. Those, very large and
+    # non-finite amounts are formatted one by one.
+    with np.errstate(invalid="ignore"):
+        exact = (cents < 2 ** 40) & (np.abs(cents - np.floor(cents) - 0.5) > 0.001)
+    rounded = np.where(exact, np.rint(cents), 0).astype(np.int64)
+    dollars = rounded // 100
+    text = pd.Series(THOUSANDS_TEXT.take(dollars % 1000), index=amounts.index)
+    rest = dollars // 1000
+    while rest.any():
+        text = pd.Series(THOUSANDS_TEXT.take(rest % 1000), index=amounts.index) + "," + text
+        rest = rest // 1000
+    # Drop the padding of the leading group ("000,012" -> "12"), keeping one
+    # digit for amounts under a dollar
+    text = text.str.lstrip("0,").replace("", "0")
+    sign = pd.Series(np.where(np.signbit(values), "$-", "$"), index=amounts.index, dtype="str")
+    result = sign + text + "." + pd.Series(CENTS_TEXT.take(rounded % 100), index=amounts.index)
+    if not exact.all():
+        result[~exact] = amounts[~exact].map(format_currency)
+    return result
+
+
+def money_cell(ws, amount):
+    cell = WriteOnlyCell(ws, value=float(amount))
+    cell.number_format = CURRENCY_FORMAT
+    return cell
+
+
+def percent_cell(ws, fraction):
+    cell = WriteOnlyCell(ws, value=fraction)
+    cell.number_format = PERCENT_FORMAT
+    return cell
+
+
+def damage_store(damages):
+    # The report writers read rows straight from a DamageStore; frames and
+    # entry lists (e.g. from a project file) are loaded into one first
+    if isinstance(damages, DamageStore):
+        return damages
+    if isinstance(damages, pd.DataFrame):
+        return store_from_frame(damages)
+    return DamageStore(damages)
+
+
+def store_from_frame(damages_df):
+    # Column-wise load of a report frame; each distinct label is resolved once
+    store = DamageStore()
+    n = len(damages_df)
+    store._reserve(n)
+    store._ids[:n] = np.arange(n)
+    store._next_id = n
+    store._cost[:n] = damages_df['Cost'].to_numpy(dtype=np.float64)
+    store._date[:n] = damages_df['Date'].to_numpy(dtype=object).astype("datetime64[D]")
+    codes, labels = pd.factorize(damages_df['Category'])
+    table = []
+    for label in labels:
+        triple = category_triple(label)
+        code = store._categories["ids"].get(triple)
+        table.append(code if code is not None else register_category(store._categories, triple))
+    store._category[:n] = np.array(table, dtype=np.int32).take(codes)
+    for col in DamageStore.TEXT_COLUMNS:
+        if col in damages_df.columns:
+            store._text[col][:n] = damages_df[col].to_numpy(dtype=object)
+        else:
+            store._text[col][:n] = ''
+    store._size = n
+    return store
+
+
+def create_excel_report(damages, project_name, drive_folder_url="Not configured", totals=None):
+    output = io.BytesIO()
+    write_excel_report(output, damages, project_name, drive_folder_url, totals)
+    return output.getvalue()
+
+
+@timed()
+def write_excel_report(target, damages, project_name, drive_folder_url="Not configured", totals=None):
+    # Streams the report row by row through a write-only workbook so memory
+    # stays flat as the claim grows. Rows come from the store's arrays a
+    # slice at a time, walked through index arrays for the sorted and
+    # filtered sheets. target is a path or a binary file object. Amounts are
+    # written as numbers with a currency format so they can be summed in
+    # Excel.
+    wb = Workbook(write_only=True)
+    store = damage_store(damages)
+    
+    if len(store) == 0:
+        ws = wb.create_sheet('No Data')
+        ws.append(['Message'])
+        ws.append(['No damages recorded'])
+        wb.save(target)
+        return
+    
+    if totals is None:
+        totals = totals_from_frame(store.frame())
+    date_order = store.date_order()
+    groups = store.category_positions(date_order)
+    
+    total_cost = totals["sum"]
+    
+    # Sheet 1: Executive Summary
+    ws = wb.create_sheet('Executive Summary')
+    ws.append(['DAMAGE CLAIM SUMMARY REPORT'])
+    ws.append(['Project: ' + project_name])
+    ws.append([])
+    ws.append(['Report Generated:', datetime.now().strftime("%Y-%m-%d %H:%M")])
+    ws.append([])
+    ws.append(['KEY METRICS'])
+    ws.append(['Total Damages Claimed:', money_cell(ws, total_cost)])
+    ws.append(['Number of Damage Items:', totals["count"]])
+    ws.append(['Number of Categories:', len(totals["categories"])])
+    ws.append(['Average Damage Amount:', money_cell(ws, total_cost / totals["count"])])
+    ws.append(['Highest Single Damage:', money_cell(ws, totals["max"])])
+    ws.append(['Lowest Single Damage:', money_cell(ws, totals["min"])])
+    ws.append(['Date Range:', str(totals["date_min"]) + " to " + str(totals["date_max"])])
+    ws.append([])
+    ws.append(['CATEGORY BREAKDOWN', 'Amount', 'Percentage'])
+    
+    for category in groups:
+        cat_total = totals["categories"][category]["sum"]
+        share = (cat_total / total_cost) if total_cost > 0 else 0
+        ws.append([category, money_cell(ws, cat_total), percent_cell(ws, share)])
+    
+    ws.append([])
+    ws.append(['GRAND TOTAL:', money_cell(ws, total_cost), percent_cell(ws, 1.0)])
+    
+    ws.append([])
+    ws.append(['BY TOP-LEVEL CATEGORY', 'Amount', 'Percentage'])
+    top_totals = rollup_totals(totals)
+    for top in sorted(top_totals):
+        share = (top_totals[top]["sum"] / total_cost) if total_cost > 0 else 0
+        ws.append([top, money_cell(ws, top_totals[top]["sum"]), percent_cell(ws, share)])
+    
+    # Sheet 2: All Damages Categorized
+    ws = wb.create_sheet('All Damages Categorized')
+    ws.append(['COMPREHENSIVE DAMAGE LIST BY CATEGORY'])
+    ws.append(['Project: ' + project_name])
+    ws.append([])
+    
+    category_order = list(groups)
+    for category, positions in groups.items():
+        ws.append(['=== CATEGORY: ' + category + ' ==='])
+        ws.append(['Date', 'Title', 'Description', 'Amount', 'Receipt File', 'Link', 'Notes'])
+        
+        for date, title, desc, cost, receipt, link in store.rows(
+                ('Date', 'Title', 'Description', 'Cost', 'Receipt', 'Link'), positions):
+            ws.append([date, title, desc, money_cell(ws, cost), receipt, link])
+        
+        ws.append([])
+        ws.append([None, None, None, 'SUBTOTAL - ' + category + ':',
+                   money_cell(ws, totals["categories"][category]["sum"])])
+        if category != category_order[-1]:
+            ws.append([])
+    
+    ws.append([])
+    ws.append([None, None, None, 'GRAND TOTAL:', money_cell(ws, total_cost)])
+    
+    # Sheet 3: Category Analysis
+    ws = wb.create_sheet('Category Analysis')
+    ws.append(['DETAILED CATEGORY ANALYSIS'])
+    ws.append(['Project: ' + project_name])
+    ws.append([])
+    
+    for category in groups:
+        cat_stats = totals["categories"][category]
+        cat_total = cat_stats["sum"]
+        share = (cat_total / total_cost) if total_cost > 0 else 0
+        
+        ws.append(['=== ' + category + ' ==='])
+        ws.append(['Number of Items:', cat_stats["count"]])
+        ws.append(['Total Amount:', money_cell(ws, cat_total)])
+        ws.append(['Percentage of Total:', percent_cell(ws, share)])
+        ws.append(['Average per Item:', money_cell(ws, cat_total / cat_stats["count"])])
+        ws.append(['Highest Item:', money_cell(ws, cat_stats["max"])])
+        ws.append(['Lowest Item:', money_cell(ws, cat_stats["min"])])
+        ws.append([])
+    
+    # Sheet 4: Chronological View
+    ws = wb.create_sheet('Chronological View')
+    ws.append(['CHRONOLOGICAL DAMAGE LIST'])
+    ws.append(['Project: ' + project_name])
+    ws.append([])
+    ws.append(['Date', 'Category', 'Title', 'Amount', 'Running Total'])
+    
+    running = 0.0
+    for date, category, title, cost in store.rows(('Date', 'Category', 'Title', 'Cost'), date_order):
+        running = running + cost
+        ws.append([date, category, title, money_cell(ws, cost), money_cell(ws, running)])
+    
+    ws.append([])
+    ws.append([None, None, 'FINAL TOTAL:', money_cell(ws, total_cost)])
+    
+    # Sheet 5: Receipt Status
+    ws = wb.create_sheet('Receipt Status')
+    ws.append(['RECEIPT DOCUMENTATION STATUS'])
+    ws.append(['Project: ' + project_name])
+    ws.append([])
+    ws.append(['Status', 'Count', 'Amount'])
+    ws.append(['With Receipts:', totals["receipt_count"], money_cell(ws, totals["receipt_sum"])])
+    ws.append(['Without Receipts:', totals["no_receipt_count"], money_cell(ws, totals["no_receipt_sum"])])
+    ws.append(['Total:', totals["count"], money_cell(ws, total_cost)])
+    ws.append([])
+    
+    if totals["no_receipt_count"] > 0:
+        ws.append(['ITEMS NEEDING RECEIPTS:'])
+        ws.append(['Date', 'Title', 'Amount'])
+        for date, title, cost in store.rows(('Date', 'Title', 'Cost'), store.missing_receipt_positions()):
+            ws.append([date, title, money_cell(ws, cost)])
+    else:
+        ws.append(['All items have receipts'])
+    
+    ws.append([])
+    ws.append(['Google Drive:', drive_folder_url])
+    
+    # Sheet 6: Damages Over Time
+    ws = wb.create_sheet('Damages Over Time')
+    ws.append(['MONTHLY DAMAGES BY TOP-LEVEL CATEGORY'])
+    ws.append(['Project: ' + project_name])
+    ws.append([])
+    
+    amounts = period_frame(totals, "month")
+    counts = period_frame(totals, "month", None, "count")['Total']
+    ws.append(['Month', 'Items', 'Amount', 'Running Total'] + list(amounts.columns))
+    month_sums = amounts.sum(axis=1)
+    for month, count, amount, running, row in zip(amounts.index, counts.tolist(), month_sums.tolist(),
+                                                  month_sums.cumsum().tolist(), amounts.itertuples(index=False)):
+        ws.append([month, int(count), money_cell(ws, amount), money_cell(ws, running)] +
+                  [money_cell(ws, cell) for cell in row])
+    
+    ws.append([])
+    ws.append(['TOTAL', totals["count"], money_cell(ws, total_cost), None] +
+              [money_cell(ws, cell) for cell in amounts.sum().tolist()])
+    
+    wb.save(target)
+
+
+def legal_summary_blocks(damages, project_name, drive_folder_url="Not configured", totals=None):
+    # Yields the legal summary as lists of lines, one section (or one slice
+    # of a long item list) at a time, so neither the document nor a sorted
+    # copy of the damages is ever built in full
+    store = damage_store(damages)
+    if len(store) == 0:
+        yield ["No damages recorded."]
+        return
+    
+    if totals is None:
+        totals = totals_from_frame(store.frame())
+    total = totals["sum"]
+    lines = []
+    
+    lines.append("=" * 80)
+    lines.append("DAMAGE CLAIM DOCUMENTATION - LEGAL SUMMARY REPORT")
+    lines.append("=" * 80)
+    lines.append("")
+    lines.append("PROJECT: " + project_name)
+    lines.append("GENERATED: " + datetime.now().strftime('%Y-%m-%d %H:%M'))
+    lines.append("")
+    lines.append("-" * 80)
+    lines.append("I. EXECUTIVE SUMMARY")
+    lines.append("-" * 80)
+    lines.append("")
+    lines.append("TOTAL DAMAGES CLAIMED: " + format_currency(total))
+    lines.append("")
+    lines.append("Key Statistics:")
+    lines.append("  Total Items: " + str(totals["count"]))
+    lines.append("  Categories: " + str(len(totals["categories"])))
+    lines.append("  Date Range: " + str(totals["date_min"]) + " to " + str(totals["date_max"]))
+    lines.append("  Average: " + format_currency(total / totals["count"]))
+    lines.append("  Highest: " + format_currency(totals["max"]))
+    lines.append("  Lowest: " + format_currency(totals["min"]))
+    lines.append("")
+    lines.append("-" * 80)
+    lines.append("II. BREAKDOWN BY CATEGORY")
+    lines.append("-" * 80)
+    yield lines
+    
+    for category, positions in store.category_positions().items():
+        cat_stats = totals["categories"][category]
+        cat_total = cat_stats["sum"]
+        pct = (cat_total / total * 100) if total > 0 else 0
+        
+        lines = []
+        lines.append("")
+        lines.append(category.upper())
+        lines.append("=" * len(category))
+        lines.append("Total: " + format_currency(cat_total) + " ({:.1f}%)".format(pct))
+        lines.append("Items: " + str(cat_stats["count"]))
+        lines.append("Average: " + format_currency(cat_total / cat_stats["count"]))
+        lines.append("")
+        lines.append("Itemized:")
+        yield lines
+        
+        for dates, titles, costs in store.column_chunks(('Date', 'Title', 'Cost'), positions):
+            amounts = format_currency_column(pd.Series(costs)).tolist()
+            yield ["  - " + date + " | " + title + " | " + amount
+                   for date, title, amount in zip(dates, titles, amounts)]
+        
+        yield ["", "SUBTOTAL: " + format_currency(cat_total)]
+    
+    yield ["", "-" * 80, "III.  CHRONOLOGICAL LIST", "-" * 80, ""]
+    
+    # Walks the entries in date order through an index array instead of a
+    # sorted copy; ties keep their entry order
+    running = 0.0
+    for dates, titles, costs in store.column_chunks(('Date', 'Title', 'Cost'), store.date_order()):
+        part_running = np.cumsum(np.concatenate(([running], costs)))[1:]
+        running = part_running[-1]
+        amounts = format_currency_column(pd.Series(costs)).tolist()
+        running_amounts = format_currency_column(pd.Series(part_running)).tolist()
+        yield [date + " | " + title[:30] + " | " + amount + " | Running: " + running_amount
+               for date, title, amount, running_amount in zip(dates, titles, amounts, running_amounts)]
+    
+    lines = []
+    lines.append("")
+    lines.append("-" * 80)
+    lines.append("IV. RECEIPT STATUS")
+    lines.append("-" * 80)
+    lines.append("")
+    lines.append("Total Items: " + str(totals["count"]))
+    lines.append("With Receipts: " + str(totals["receipt_count"]))
+    lines.append("Missing Receipts: " + str(totals["no_receipt_count"]))
+    lines.append("Receipt Location: " + drive_folder_url)
+    lines.append("")
+    lines.append("-" * 80)
+    lines.append("V. GRAND TOTAL")
+    lines.append("-" * 80)
+    lines.append("")
+    lines.append("+------------------------------------------+")
+    lines.append("|                                          |")
+    lines.append("|   TOTAL DAMAGES: " + format_currency(total).rjust(20) + "   |")
+    lines.append("|                                          |")
+    lines.append("+------------------------------------------+")
+    lines.append("")
+    lines.append("=" * 80)
+    lines.append("END OF REPORT")
+    lines.append("=" * 80)
+    yield lines
+
+
+def iter_legal_summary(damages, project_name, drive_folder_url="Not configured", totals=None):
+    # Text chunks that concatenate to create_legal_summary's result
+    separator = ""
+    for block in legal_summary_blocks(damages, project_name, drive_folder_url, totals):
+        if block:
+            yield separator + "\n".join(block)
+            separator = "\n"
+
+
+def create_legal_summary(damages, project_name, drive_folder_url="Not configured", totals=None):
+    return "".join(iter_legal_summary(damages, project_name, drive_folder_url, totals))
+
+
+@timed()
+def write_legal_summary(out, damages, project_name, drive_folder_url="Not configured", totals=None):
+    # Writes the summary as UTF-8 to a binary file object (a file, a socket
+    # or an HTTP response body) one section at a time
+    for chunk in iter_legal_summary(damages, project_name, drive_folder_url, totals):
+        out.write(chunk.encode("utf-8"))
+
+
+@timed()
+def write_legal_summary_pdf(out, damages, project_name, drive_folder_url="Not configured", totals=None):
+    lines = (line for block in legal_summary_blocks(damages, project_name, drive_folder_url, totals)
+             for line in block)
+    write_pdf_text(out, lines, project_name + " - Legal Summary")
+
+
+def pdf_string(text):
+    # PDF literal string in the WinAnsi encoding of the standard fonts
+    text = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return b"(" + text.encode("cp1252", errors="replace") + b")"
+
+
+def write_pdf_text(out, lines, title=""):
+    # Minimal PDF writer for monospaced text. Each page is written as soon as
+    # it is full, so only one page of lines is held at a time, and offsets
+    # are counted rather than read back so out does not need to be seekable.
+    # Object 1 is the catalog, 2 the page tree, 3 the font and 4 the document
+    # info; page contents and pages follow.
+    width, height = PDF_PAGE_SIZE
+    per_page = int((height - 2 * PDF_MARGIN) // PDF_LINE_HEIGHT) - 2
+    offsets = {}
+    written = [0]
+    
+    def emit(data):
+        out.write(data)
+        written[0] = written[0] + len(data)
+    
+    def emit_object(obj_id, body):
+        offsets[obj_id] = written[0]
+        emit(str(obj_id).encode() + b" 0 obj\n" + body + b"\nendobj\n")
+    
+    def emit_page(page_lines):
+        page_no = len(page_ids) + 1
+        content = [b"BT /F1 " + str(PDF_FONT_SIZE).encode() + b" Tf " + str(PDF_LINE_HEIGHT).encode() + b" TL",
+                   str(PDF_MARGIN).encode() + b" " + str(height - PDF_MARGIN).encode() + b" Td"]
+        for line in page_lines:
+            content.append(pdf_string(line) + b" '")
+        content.append(b"ET BT /F1 " + str(PDF_FONT_SIZE).encode() + b" Tf " + str(PDF_MARGIN).encode() + b" " +
+                       str(PDF_MARGIN // 2).encode() + b" Td " + pdf_string("Page " + str(page_no)) + b" Tj ET")
+        stream = b"\n".join(content)
+        content_id = 5 + 2 * len(page_ids)
+        emit_object(content_id, b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream +
+                    b"\nendstream")
+        emit_object(content_id + 1, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 " + str(width).encode() + b" " +
+                    str(height).encode() + b"] /Contents " + str(content_id).encode() +
+                    b" 0 R /Resources << /Font << /F1 3 0 R >> >> >>")
+        page_ids.append(content_id + 1)
+    
+    page_ids = []
+    emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    emit_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>")
+    # Document info strings are UTF-16 rather than WinAnsi
+    title = b"<FEFF" + title.encode("utf-16-be").hex().upper().encode() + b">"
+    emit_object(4, b"<< /Title " + title + b" /Producer (Damage Invoice Tracker) >>")
+    
+    page_lines = []
+    for line in lines:
+        # Long lines are wrapped rather than cut off at the page edge
+        while True:
+            page_lines.append(line[:PDF_LINE_CHARS])
+            if len(page_lines) == per_page:
+                emit_page(page_lines)
+                page_lines = []
+            line = line[PDF_LINE_CHARS:]
+            if not line:
+                break
+    if page_lines or not page_ids:
+        emit_page(page_lines)
+    
+    emit_object(2, b"<< /Type /Pages /Kids [" + b" ".join(str(i).encode() + b" 0 R" for i in page_ids) +
+                b"] /Count " + str(len(page_ids)).encode() + b" >>")
+    emit_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    
+    xref_at = written[0]
+    size = max(offsets) + 1
+    emit(b"xref\n0 " + str(size).encode() + b"\n0000000000 65535 f \n")
+    emit(b"".join(("%010d 00000 n \n" % offsets[i]).encode() for i in range(1, size)))
+    emit(b"trailer\n<< /Size " + str(size).encode() + b" /Root 1 0 R /Info 4 0 R >>\nstartxref\n" +
+         str(xref_at).encode() + b"\n%%EOF\n")
+
+
+def export_file(write, *args):
+    # Runs write(out, *args) against a temporary file and returns the file
+    # open for reading, so a download hands over a file object instead of
+    # bytes held by the caller. The file is removed once the returned object
+    # is closed and collected.
+    with tempfile.NamedTemporaryFile(suffix=".part", delete=False) as out:
+        try:
+            write(out, *args)
+        except BaseException:
+            out.close()
+            os.remove(out.name)
+            raise
+    reader = open(out.name, "rb")
+    weakref.finalize(reader, os.remove, out.name)
+    return reader
+
+
+def build_excel_export(project):
+    return export_file(write_excel_report, project["damages"], project["project_name"],
+                       project["drive_folder_url"], project["damage_totals"])
+
+
+def build_summary_export(project):
+    return export_file(write_legal_summary, project["damages"], project["project_name"],
+                       project["drive_folder_url"], project["damage_totals"])
+
+
+def build_summary_pdf_export(project):
+    return export_file(write_legal_summary_pdf, project["damages"], project["project_name"],
+                       project["drive_folder_url"], project["damage_totals"])
+
+
+def build_csv_export(project):
+    return damages_frame(project["damages"]).to_csv(index=False).encode('utf-8')
+
+
+def build_project_export(project):
+    out = io.StringIO()
+    write_project_file(out, project)
+    return out.getvalue().encode('utf-8')
+
+
+REPORT_FORMATS = ("excel", "summary", "pdf", "csv")
+REPORT_SUFFIXES = {"excel": "_Report.xlsx", "summary": "_Summary.txt", "pdf": "_Summary.pdf", "csv": "_Data.csv"}
+# Bump when the report layout changes so batch runs render everything again
+REPORT_LAYOUT_VERSION = 1
+REPORT_MANIFEST = ".report-manifest.json"
+PROJECT_FILE_EXTENSIONS = (".jsonl", ".json")
+
+
+def write_reports(project, out_dir, base_name, formats=REPORT_FORMATS):
+    # Writes the requested reports for one project, the same files the app's
+    # export buttons produce, and returns their paths
+    store = DamageStore(project["damages"])
+    totals = totals_from_frame(store.frame())
+    base = os.path.join(out_dir, base_name)
+    paths = []
+    if "excel" in formats:
+        paths.append(base + REPORT_SUFFIXES["excel"])
+        write_excel_report(paths[-1], store, project["project_name"], project["drive_folder_url"], totals)
+    if "summary" in formats:
+        paths.append(base + REPORT_SUFFIXES["summary"])
+        with open(paths[-1], "wb") as f:
+            write_legal_summary(f, store, project["project_name"], project["drive_folder_url"], totals)
+    if "pdf" in formats:
+        paths.append(base + REPORT_SUFFIXES["pdf"])
+        with open(paths[-1], "wb") as f:
+            write_legal_summary_pdf(f, store, project["project_name"], project["drive_folder_url"], totals)
+    if "csv" in formats:
+        paths.append(base + REPORT_SUFFIXES["csv"])
+        store.frame().to_csv(paths[-1], index=False)
+    return paths
+
+
+def project_content_hash(project, formats):
+    # Hash of everything the reports are built from. The save time in the
+    # project file header is left out, so re-saving an unchanged project
+    # does not cause a re-render.
+    digest = hashlib.sha256()
+    digest.update(json.dumps([REPORT_LAYOUT_VERSION, sorted(formats)] +
+                             [project[field] for field in PROJECT_FIELDS]).encode("utf-8"))
+    for dmg in project["damages"]:
+        digest.update(json.dumps(dmg, sort_keys=True, separators=(',', ':')).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def report_base_name(path):
+    # Reports are named after the project file so a batch of claims with the
+    # same project name does not overwrite itself
+    return safe_project_name(os.path.splitext(os.path.basename(path))[0])
+
+
+def render_project(path, out_dir, formats, known_hash=None):
+    # Renders one project file and returns a result row for the timing
+    # summary. Runs in a worker process during batch runs.
+    start = time.perf_counter()
+    base_name = report_base_name(path)
+    result = {"project": path, "base_name": base_name, "status": "failed", "entries": 0, "hash": None,
+              "errors": [], "stamp": project_file_stamp(path)}
+    try:
+        with open(path, "rb") as f:
+            project, errors = read_project_file(f)
+    except OSError as e:
+        project, errors = None, [str(e)]
+
+    if errors:
+        result["errors"] = errors
+    else:
+        result["hash"] = project_content_hash(project, formats)
+        result["entries"] = len(project["damages"])
+        outputs = [os.path.join(out_dir, base_name + REPORT_SUFFIXES[kind]) for kind in formats]
+        if result["hash"] == known_hash and all(os.path.exists(p) for p in outputs):
+            result["status"] = "skipped"
+        else:
+            write_reports(project, out_dir, base_name, formats)
+            result["status"] = "rendered"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def render_project_job(job):
+    return render_project(*job)
+
+
+def find_project_files(paths):
+    # Directories are expanded to the project files directly inside them
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(PROJECT_FILE_EXTENSIONS):
+                    found.append(os.path.join(path, name))
+        else:
+            found.append(path)
+    return found
+
+
+def read_report_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, REPORT_MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_report_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, REPORT_MANIFEST)
+    with open(path + ".part", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".part", path)
+
+
+def render_projects(paths, out_dir, formats=REPORT_FORMATS, workers=1, max_tasks_per_child=None, force=False):
+    # Renders every project, in a process pool when workers > 1. Workers are
+    # replaced after max_tasks_per_child projects so memory held by one large
+    # claim is returned to the system. Projects whose content hash matches
+    # the manifest from the previous run (and whose reports still exist) are
+    # skipped unless force is set; files that were not touched since a run
+    # with the same layout version and formats are skipped without being
+    # read. Yields one result row per project as it finishes.
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {} if force else read_report_manifest(out_dir)
+    known = {}
+    pending = []
+    claimed = {}
+    for path in paths:
+        base_name = report_base_name(path)
+        if claimed.setdefault(base_name, path) != path:
+            # Both projects would write the same report files
+            yield {"project": path, "base_name": base_name, "status": "failed", "entries": 0, "hash": None,
+                   "errors": ["reports would overwrite those of " + claimed[base_name]], "seconds": 0.0}
+            continue
+        entry = manifest.get(os.path.abspath(path), {})
+        known[path] = entry.get("hash")
+        untouched = (project_file_stamp(path) == entry.get("stamp") and
+                     entry.get("layout") == REPORT_LAYOUT_VERSION and entry.get("formats") == sorted(formats))
+        outputs = [os.path.join(out_dir, base_name + REPORT_SUFFIXES[kind]) for kind in formats]
+        if untouched and known[path] and all(os.path.exists(p) for p in outputs):
+            yield {"project": path, "base_name": base_name, "status": "skipped",
+                   "entries": entry.get("entries", 0), "hash": known[path], "errors": [], "seconds": 0.0}
+        else:
+            pending.append(path)
+
+    if workers > 1 and len(pending) > 1:
+        # multiprocessing.Pool rather than ProcessPoolExecutor, whose
+        # max_tasks_per_child can deadlock on Python 3.11
+        jobs = [(path, out_dir, formats, known[path]) for path in pending]
+        with multiprocessing.Pool(workers, maxtasksperchild=max_tasks_per_child) as pool:
+            for result in pool.imap_unordered(render_project_job, jobs):
+                record_render(manifest, result, formats)
+                yield result
+    else:
+        for path in pending:
+            result = render_project(path, out_dir, formats, known[path])
+            record_render(manifest, result, formats)
+            yield result
+    write_report_manifest(out_dir, manifest)
+
+
+def record_render(manifest, result, formats):
+    # Entries are keyed by the project's absolute path and remember what the
+    # reports were rendered with, so a layout or format change re-renders
+    if result["status"] != "failed":
+        manifest[os.path.abspath(result["project"])] = {
+            "project": result["project"], "base_name": result["base_name"], "hash": result["hash"],
+            "entries": result["entries"], "stamp": result["stamp"], "layout": REPORT_LAYOUT_VERSION,
+            "formats": sorted(formats)}
+
+
+def project_file_stamp(path):
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return [info.st_size, info.st_mtime_ns]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate the Excel report, legal summary (text and PDF) and CSV data for saved project files")
+    parser.add_argument("projects", nargs="+",
+                        help="project files saved by the app (.jsonl or older .json), or directories of them")
+    parser.add_argument("--out-dir", default=".", help="directory for the reports (default: current directory)")
+    parser.add_argument("--formats", nargs="+", choices=REPORT_FORMATS, default=list(REPORT_FORMATS),
+                        help="reports to generate (default: all)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--max-tasks-per-child", type=int, default=20,
+                        help="projects a worker renders before it is replaced (default: 20)")
+    parser.add_argument("--force", action="store_true", help="render projects even if they are unchanged")
+    parser.add_argument("--timings", help="write the per-project results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    paths = find_project_files(args.projects)
+    start = time.perf_counter()
+    results = []
+    for result in render_projects(paths, args.out_dir, args.formats, args.workers,
+                                  args.max_tasks_per_child, args.force):
+        results.append(result)
+        print("{:<8} {:>8.2f}s {:>8} entries  {}".format(result["status"], result["seconds"], result["entries"],
+                                                         result["project"]))
+        for error in result["errors"]:
+            print(result["project"] + ": " + error, file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    counts = {"rendered": 0, "skipped": 0, "failed": 0}
+    for result in results:
+        counts[result["status"]] = counts[result["status"]] + 1
+    print(str(len(results)) + " projects in {:.2f}s: ".format(elapsed) + str(counts["rendered"]) + " rendered, " +
+          str(counts["skipped"]) + " unchanged, " + str(counts["failed"]) + " failed")
+    if args.timings:
+        with open(args.timings, "w") as f:
+            json.dump({"seconds": elapsed, "workers": args.workers, "projects": results}, f, indent=2)
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import ast
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+APP_PATH = os.path.join(ROOT, "app.py")
+
+VEHICLE = "Property Damage - Vehicle repair/replacement"
+
+
+def entry(title, date="2024-03-01", cost=10.0, category=VEHICLE, receipt="", description=""):
+    return {"Title": title, "Description": description, "Date": date, "Category": category, "Cost": cost,
+            "Receipt": receipt, "Link": ""}
+
+
+def new_project(damages=(), name="Claim"):
+    return {"project_name": name, "project_created_date": "2024-01-01 09:00", "drive_folder_url": "",
+            "damages": list(damages)}
+
+
+def app_nodes(tree):
+    # Imports, constants, functions and classes of app.py, plus the
+    # `if "key" not in st.session_state` defaults; page setup and the UI are
+    # left out
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef)):
+            yield node
+        elif isinstance(node, ast.Assign) and all(isinstance(t, ast.Name) and t.id.isupper() for t in node.targets):
+            yield node
+        elif (isinstance(node, ast.If) and isinstance(node.test, ast.Compare) and
+              isinstance(node.test.ops[0], ast.NotIn) and ast.unparse(node.test.comparators[0]) == "st.session_state"):
+            yield node
+
+
+def load_app():
+    with open(APP_PATH) as f:
+        tree = ast.parse(f.read())
+    app = {"__name__": "app", "__file__": APP_PATH}
+    exec(compile(ast.Module(body=list(app_nodes(tree)), type_ignores=[]), APP_PATH, "exec"), app)
+    return app
+
+
+def new_session(app):
+    # Starts over with the defaults of a fresh session
+    app["st"].session_state.clear()
+    with open(APP_PATH) as f:
+        tree = ast.parse(f.read())
+    defaults = [node for node in app_nodes(tree) if isinstance(node, ast.If)]
+    exec(compile(ast.Module(body=defaults, type_ignores=[]), APP_PATH, "exec"), app)
+
+
+@pytest.fixture
+def app(tmp_path):
+    # App functions in Streamlit's bare mode, with their own database and
+    # upload folder
+    app = load_app()
+    app["PROJECT_DB_PATH"] = str(tmp_path / "projects.db")
+    app["UPLOAD_DIR"] = str(tmp_path / "uploads")
+    app["ARCHIVE_DIR"] = os.path.join(app["UPLOAD_DIR"], "archive")
+    for name in ("init_project_db", "get_blob_registry"):
+        app[name].clear()
+    new_session(app)
+    yield app
+    for name in ("init_project_db", "get_blob_registry"):
+        app[name].clear()
+    app["st"].session_state.clear()
+
+
+@pytest.fixture
+def errors(app, monkeypatch):
+    # Messages the app shows with st.error
+    shown = []
+    monkeypatch.setattr(app["st"], "error", shown.append)
+    return shown
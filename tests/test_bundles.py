@@ -0,0 +1,82 @@
+import io
+import os
+import zipfile
+from types import SimpleNamespace
+
+from conftest import entry, new_project, new_session
+
+
+def bundle_bytes(app):
+    session = app["st"].session_state
+    project = app["current_project"]()
+    project["receipts"] = dict(session["uploaded_files_data"])
+    project["damage_totals"] = app["get_damage_totals"]()
+    out = io.BytesIO()
+    app["write_project_bundle"](out, project)
+    return out.getvalue()
+
+
+def open_project_with_receipt(app, name, content):
+    app["apply_project"](new_project(name=name))
+    receipt_id = app["store_receipt"](io.BytesIO(content), "invoice.pdf")
+    app["add_damage_entry"](entry("Tow", receipt=receipt_id))
+    return app["st"].session_state["project_id"], receipt_id
+
+
+def stored_receipt_ids(app, project_id):
+    return [row[0] for row in app["db_load_project"](project_id)[2]]
+
+
+def test_bundles_restore_the_project_and_its_receipts(app, errors):
+    project_id, receipt_id = open_project_with_receipt(app, "Bundle claim", b"%PDF-1.4 receipt")
+    app["add_damage_entry"](entry("Taxi", cost=20.0))
+    data = bundle_bytes(app)
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        names = zf.namelist()
+    assert app["BUNDLE_RECEIPT_DIR"] + receipt_id in names
+    assert app["BUNDLE_REPORT_DIR"] + "Bundle_claim_Report.xlsx" in names
+
+    new_session(app)
+    session = app["st"].session_state
+    assert app["load_project_bundle"](io.BytesIO(data)) is True
+    assert errors == []
+    assert session["project_id"] == project_id
+    assert [dmg["Title"] for dmg in session["damages"]] == ["Tow", "Taxi"]
+    meta = session["uploaded_files_data"][receipt_id]
+    assert meta["refs"] == 1
+    with open(os.path.join(app["UPLOAD_DIR"], meta["blob"]), "rb") as f:
+        assert f.read() == b"%PDF-1.4 receipt"
+
+
+def test_bundle_receipts_are_stored_under_the_loaded_project(app, errors):
+    other_id, other_receipt = open_project_with_receipt(app, "B", b"%PDF-1.4 receipt of B")
+    data = bundle_bytes(app)
+
+    new_session(app)
+    open_id, open_receipt = open_project_with_receipt(app, "A", b"%PDF-1.4 receipt of A")
+    assert app["load_project_bundle"](io.BytesIO(data)) is True
+    assert app["st"].session_state["project_id"] == other_id
+    assert stored_receipt_ids(app, open_id) == [open_receipt]
+    assert stored_receipt_ids(app, other_id) == [other_receipt]
+
+
+def test_oversized_bundles_are_rejected_before_extracting(app, errors):
+    app["apply_project"](new_project([entry("A")]))
+    data = bundle_bytes(app)
+    project_count = len(app["db_list_projects"]())
+    app["BUNDLE_MAX_BYTES"] = 100
+    new_session(app)
+    assert app["load_project_bundle"](io.BytesIO(data)) is False
+    assert "the limit is " + app["format_file_size"](100) in errors[0]
+    assert len(app["db_list_projects"]()) == project_count
+    assert app["st"].session_state["project_id"] is None
+
+
+def test_bundle_member_limits(app):
+    app["BUNDLE_MAX_MEMBERS"] = 3
+    app["BUNDLE_MAX_BYTES"] = 1000
+    infos = [SimpleNamespace(file_size=300) for _ in range(3)]
+    assert app["check_bundle_members"](infos) == []
+    infos.append(SimpleNamespace(file_size=300))
+    assert [e.split(",")[0] for e in app["check_bundle_members"](infos)] == [
+        "Bundle contains 4 files", "Bundle unpacks to " + app["format_file_size"](1200)]
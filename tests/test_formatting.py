@@ -0,0 +1,12 @@
+import numpy as np
+import pandas as pd
+
+from reporting import format_currency, format_currency_column
+
+
+def test_currency_column_matches_format_currency():
+    amounts = pd.Series([0.0, 0.5, 2.675, 999.995, 1234.5, -1234.5, -0.0, 1e6, 1e15 + 0.125,
+                         np.nan, np.inf], index=range(10, 21))
+    amounts = pd.concat([amounts, pd.Series(np.random.default_rng(0).lognormal(4, 3, 2000))])
+    assert format_currency_column(amounts).tolist() == [format_currency(a) for a in amounts]
+    assert format_currency_column(pd.Series([], dtype=float)).tolist() == []
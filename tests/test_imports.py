@@ -0,0 +1,36 @@
+import io
+
+from conftest import new_project
+
+
+class Upload(io.BytesIO):
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+def test_imported_files_are_recorded_with_their_entries(app, errors):
+    app["apply_project"](new_project())
+    project_id = app["st"].session_state["project_id"]
+    upload = Upload(b"Item,Date,Amount,Category\nTow,2024-01-15,\"$1,250.00\",property damage\n"
+                    b"Pills,2024-02-01,12.5,Medical bills\n", "bank.csv")
+    content_hash = app["file_hash"](upload)
+    assert app["db_find_import"](project_id, content_hash) is None
+
+    assert app["import_damage_file"](upload, content_hash) == 2
+    assert errors == []
+    assert app["db_find_import"](project_id, content_hash)[:2] == ("bank.csv", 2)
+    totals = app["st"].session_state["damage_totals"]
+    assert (totals["count"], totals["cents"]) == (2, 126250)
+    assert len(app["db_load_project"](project_id)[0]["damages"]) == 2
+
+
+def test_failed_imports_add_and_record_nothing(app, errors):
+    app["apply_project"](new_project())
+    project_id = app["st"].session_state["project_id"]
+    upload = Upload(b"Title,Date,Cost,Category\nA,2024-01-01,5,Other\n,2024-01-01,5,Other\n", "bad.csv")
+    content_hash = app["file_hash"](upload)
+    assert app["import_damage_file"](upload, content_hash) is None
+    assert "Row 3" in errors[0]
+    assert app["db_find_import"](project_id, content_hash) is None
+    assert len(app["st"].session_state["damages"]) == 0
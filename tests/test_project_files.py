@@ -0,0 +1,84 @@
+import io
+import json
+
+from conftest import entry, new_project
+from reporting import PROJECT_FORMAT, DamageStore, read_project_file, write_project_file
+
+HEADER = {"format": PROJECT_FORMAT, "version": 2, "project_name": "Claim", "project_created_date": "2024-01-01",
+          "drive_folder_url": ""}
+
+
+def project_bytes(lines, header=HEADER):
+    return (json.dumps(header) + "\n").encode("utf-8") + b"".join(line + b"\n" for line in lines)
+
+
+def saved_bytes(project):
+    out = io.StringIO()
+    write_project_file(out, project)
+    return out.getvalue().encode("utf-8")
+
+
+def read(data):
+    return read_project_file(io.BytesIO(data))
+
+
+def test_saved_project_reads_back_unchanged():
+    damages = DamageStore([entry("Tow", cost=250.5), entry("Roof", "2024-02-01", 99.99, "Other - Roof repair")])
+    project = dict(new_project(damages), project_uuid="abc123")
+    loaded, errors = read(saved_bytes(project))
+    assert errors == []
+    assert loaded["project_uuid"] == "abc123"
+    assert loaded["project_name"] == "Claim"
+    assert list(DamageStore(loaded["damages"])) == list(damages)
+
+
+def test_every_line_must_hold_one_json_value():
+    # The middle lines only parse when joined together
+    loaded, errors = read(project_bytes([json.dumps(entry("A")).encode(), b"1,2", b"[3", b"4]",
+                                         json.dumps(entry("B")).encode()]))
+    assert [dmg["Title"] for dmg in loaded["damages"]] == ["A", "B"]
+    assert [error.split(":")[0] for error in errors] == ["Line 3", "Line 4", "Line 5"]
+    assert all("invalid JSON" in error for error in errors)
+
+
+def test_lines_may_be_padded_and_blank_lines_are_skipped():
+    loaded, errors = read(project_bytes([b"  " + json.dumps(entry("A")).encode() + b" \r", b"", b"   ",
+                                         json.dumps(entry("B")).encode()]))
+    assert errors == []
+    assert [dmg["Title"] for dmg in loaded["damages"]] == ["A", "B"]
+
+
+def test_bad_lines_are_reported_with_their_line_number():
+    loaded, errors = read(project_bytes([
+        json.dumps(entry("A")).encode(),
+        b'{"Title": "B", "Date": "2024-03-01", "Category": "Other", "Cost": 1.0',
+        b'{"Title": "\xff", "Date": "2024-03-01", "Category": "Other", "Cost": 1.0}',
+        json.dumps(entry("C", date="03/01/2024")).encode(),
+        json.dumps(entry("D", cost=-5)).encode(),
+    ]))
+    assert [dmg["Title"] for dmg in loaded["damages"]] == ["A"]
+    assert errors[0].startswith("Line 3: invalid JSON")
+    assert errors[1].startswith("Line 4: invalid JSON")
+    assert errors[2] == "Line 5: Date '03/01/2024' is not in YYYY-MM-DD format"
+    assert errors[3] == "Line 6: Cost -5 is not a valid amount"
+
+
+def test_older_json_project_files_are_still_read():
+    data = json.dumps({"project_name": "Old", "damages": [entry("A"), {"Title": "B"}]}, indent=2).encode()
+    loaded, errors = read(data)
+    assert loaded["project_name"] == "Old"
+    assert loaded["project_uuid"] == ""
+    assert [dmg["Title"] for dmg in loaded["damages"]] == ["A"]
+    assert errors == ["Entry 2: Category is missing"]
+
+
+def test_entries_are_saved_with_their_category_triple_only():
+    damages = DamageStore([entry("Tow"), entry("Rx", category="Medical & Health-Related - Medication costs"),
+                           entry("Roof", category="Other - Roof repair")])
+    lines = saved_bytes(new_project(damages)).decode("utf-8").splitlines()[1:]
+    assert all("Category" not in json.loads(line) for line in lines)
+    assert json.loads(lines[1])["Taxonomy"] == ["Medical & Health-Related", "Medication costs", ""]
+
+    loaded, errors = read(saved_bytes(new_project(damages)))
+    assert errors == []
+    assert [dmg["Category"] for dmg in loaded["damages"]] == [dmg["Category"] for dmg in damages]
@@ -0,0 +1,124 @@
+import io
+import json
+import sqlite3
+from contextlib import closing
+
+from conftest import VEHICLE, entry, new_project
+from reporting import DamageStore, write_project_file
+
+
+class Upload(io.BytesIO):
+    file_id = "upload-1"
+
+
+def project_upload(project, last_saved):
+    out = io.StringIO()
+    write_project_file(out, project)
+    header, rest = out.getvalue().split("\n", 1)
+    header = json.loads(header)
+    header["last_saved"] = last_saved
+    return Upload((json.dumps(header) + "\n" + rest).encode("utf-8"))
+
+
+def set_updated_at(app, project_id, updated_at):
+    with closing(sqlite3.connect(app["PROJECT_DB_PATH"])) as conn, conn:
+        conn.execute("UPDATE projects SET updated_at = ? WHERE id = ?", (updated_at, project_id))
+
+
+def stored_titles(app, project_id):
+    return [dmg["Title"] for dmg in app["db_load_project"](project_id)[0]["damages"]]
+
+
+def test_projects_round_trip_through_the_store(app):
+    project = new_project([entry("Tow", cost=250.5), entry("Roof", category="Other - Roof repair")])
+    project["project_uuid"] = "u1"
+    project_id, row_ids = app["db_create_project"](project)
+    assert len(row_ids) == 2
+    assert app["db_find_project"]("u1")[0] == project_id
+
+    loaded, loaded_ids, receipts = app["db_load_project"](project_id)
+    assert loaded_ids == row_ids and receipts == []
+    assert loaded["project_uuid"] == "u1"
+    assert [(dmg["Title"], dmg["Category"], dmg["Taxonomy"], dmg["Cost"]) for dmg in loaded["damages"]] == [
+        ("Tow", VEHICLE, ("Property Damage", "Vehicle repair/replacement", ""), 250.5),
+        ("Roof", "Other - Roof repair", ("Other", "", "Roof repair"), 10.0)]
+    assert app["db_load_project"](project_id + 1) is None
+
+
+def test_databases_from_before_the_migrations_are_upgraded(app):
+    with closing(sqlite3.connect(app["PROJECT_DB_PATH"])) as conn, conn:
+        conn.executescript("""
+            CREATE TABLE projects (id INTEGER PRIMARY KEY, name TEXT NOT NULL,
+                created_date TEXT NOT NULL DEFAULT '', drive_folder_url TEXT NOT NULL DEFAULT '',
+                updated_at TEXT NOT NULL DEFAULT '');
+            CREATE TABLE damages (id INTEGER PRIMARY KEY, project_id INTEGER NOT NULL, title TEXT NOT NULL,
+                description TEXT NOT NULL DEFAULT '', date TEXT NOT NULL, category TEXT NOT NULL,
+                cost REAL NOT NULL, receipt TEXT NOT NULL DEFAULT '', link TEXT NOT NULL DEFAULT '');
+            INSERT INTO projects (id, name) VALUES (1, 'Old');
+            INSERT INTO damages (project_id, title, date, category, cost) VALUES (1, 'A', '2024-01-01', 'Roofing', 5);
+        """)
+    loaded = app["db_load_project"](1)[0]
+    assert len(loaded["project_uuid"]) == 32
+    assert loaded["damages"][0]["Taxonomy"] is None
+    assert DamageStore(loaded["damages"])[0]["Category"] == "Other - Roofing"
+
+
+def test_a_file_saved_after_the_last_edit_replaces_the_stored_project(app):
+    app["apply_project"](new_project([entry("A"), entry("B")]))
+    session = app["st"].session_state
+    project_id = session["project_id"]
+    set_updated_at(app, project_id, "2024-05-01 10:00:00")
+
+    saved = new_project([entry("C")], name="Renamed")
+    saved["project_uuid"] = session["project_uuid"]
+    assert app["load_project_file"](project_upload(saved, "2024-05-01 10:00:00"))
+    assert session["project_id"] == project_id
+    assert [row[0] for row in app["db_list_projects"]()] == [project_id]
+    assert app["db_load_project"](project_id)[0]["project_name"] == "Renamed"
+    assert stored_titles(app, project_id) == ["C"]
+
+    # The stored copy now dates from the file, so loading it again doesn't ask
+    assert app["load_project_file"](project_upload(saved, "2024-05-01 10:00:00"))
+    assert session["load_conflict"] is None
+
+
+def test_a_file_older_than_the_stored_project_asks_before_replacing_it(app):
+    app["apply_project"](new_project([entry("A"), entry("B")]))
+    session = app["st"].session_state
+    project_id = session["project_id"]
+    set_updated_at(app, project_id, "2024-05-02 08:30:00")
+
+    older = new_project([entry("C")])
+    older["project_uuid"] = session["project_uuid"]
+    assert not app["load_project_file"](project_upload(older, "2024-05-01 10:00:00"))
+    assert session["load_conflict"] == ("upload-1", "2024-05-02 08:30:00", "2024-05-01 10:00:00")
+    assert stored_titles(app, project_id) == ["A", "B"]
+
+    assert app["load_project_file"](project_upload(older, "2024-05-01 10:00:00"), "replace")
+    assert session["project_id"] == project_id
+    assert stored_titles(app, project_id) == ["C"]
+
+
+def test_a_file_older_than_the_stored_project_can_be_loaded_as_a_new_copy(app):
+    app["apply_project"](new_project([entry("A"), entry("B")]))
+    session = app["st"].session_state
+    project_id, project_uuid = session["project_id"], session["project_uuid"]
+
+    older = new_project([entry("C")])
+    older["project_uuid"] = project_uuid
+    upload = project_upload(older, "2000-01-01 00:00:00")
+    assert not app["load_project_file"](upload)
+    assert app["load_project_file"](upload, "copy")
+    assert session["project_id"] != project_id and session["project_uuid"] != project_uuid
+    assert stored_titles(app, project_id) == ["A", "B"]
+    assert stored_titles(app, session["project_id"]) == ["C"]
+
+
+def test_files_without_a_save_time_ask_before_replacing(app):
+    app["apply_project"](new_project([entry("A")]))
+    session = app["st"].session_state
+    older = new_project([entry("C")])
+    older["project_uuid"] = session["project_uuid"]
+    assert not app["load_project_file"](project_upload(older, "yesterday"))
+    assert session["load_conflict"][2] == ""
+    assert stored_titles(app, session["project_id"]) == ["A"]
@@ -0,0 +1,93 @@
+import io
+import json
+import os
+
+import reporting
+from conftest import entry, new_project
+from reporting import REPORT_MANIFEST, read_report_manifest, render_projects, write_project_file
+
+
+def save_project(path, titles):
+    out = io.StringIO()
+    write_project_file(out, new_project([entry(title) for title in titles]))
+    with open(path, "w") as f:
+        f.write(out.getvalue())
+
+
+def statuses(paths, out_dir, **kwargs):
+    return {os.path.basename(r["project"]): r["status"] for r in render_projects(paths, out_dir, **kwargs)}
+
+
+def test_unchanged_projects_are_skipped(tmp_path):
+    first = str(tmp_path / "first.jsonl")
+    second = str(tmp_path / "second.jsonl")
+    save_project(first, ["A"])
+    save_project(second, ["B", "C"])
+    out_dir = str(tmp_path / "reports")
+
+    assert statuses([first, second], out_dir) == {"first.jsonl": "rendered", "second.jsonl": "rendered"}
+    assert sorted(os.listdir(out_dir)) == sorted(
+        [REPORT_MANIFEST] + [base + suffix for base in ("first", "second")
+                             for suffix in reporting.REPORT_SUFFIXES.values()])
+    assert statuses([first, second], out_dir) == {"first.jsonl": "skipped", "second.jsonl": "skipped"}
+
+    save_project(second, ["B", "C", "D"])
+    assert statuses([first, second], out_dir) == {"first.jsonl": "skipped", "second.jsonl": "rendered"}
+    manifest = read_report_manifest(out_dir)
+    assert manifest[os.path.abspath(second)]["entries"] == 3
+
+
+def test_resaving_unchanged_content_does_not_rerender(tmp_path):
+    path = str(tmp_path / "claim.jsonl")
+    save_project(path, ["A"])
+    out_dir = str(tmp_path / "reports")
+    assert statuses([path], out_dir) == {"claim.jsonl": "rendered"}
+    # A new save time and file stamp, same content hash
+    save_project(path, ["A"])
+    os.utime(path, ns=(0, 0))
+    assert statuses([path], out_dir) == {"claim.jsonl": "skipped"}
+
+
+def test_format_or_layout_changes_rerender(tmp_path, monkeypatch):
+    path = str(tmp_path / "claim.jsonl")
+    save_project(path, ["A"])
+    out_dir = str(tmp_path / "reports")
+    assert statuses([path], out_dir, formats=["csv"]) == {"claim.jsonl": "rendered"}
+    assert statuses([path], out_dir, formats=["csv", "summary"]) == {"claim.jsonl": "rendered"}
+    assert statuses([path], out_dir, formats=["summary", "csv"]) == {"claim.jsonl": "skipped"}
+
+    monkeypatch.setattr(reporting, "REPORT_LAYOUT_VERSION", reporting.REPORT_LAYOUT_VERSION + 1)
+    assert statuses([path], out_dir, formats=["csv", "summary"]) == {"claim.jsonl": "rendered"}
+    assert statuses([path], out_dir, formats=["csv", "summary"], force=True) == {"claim.jsonl": "rendered"}
+
+
+def test_missing_reports_are_rendered_again(tmp_path):
+    path = str(tmp_path / "claim.jsonl")
+    save_project(path, ["A"])
+    out_dir = str(tmp_path / "reports")
+    statuses([path], out_dir, formats=["csv"])
+    os.remove(os.path.join(out_dir, "claim" + reporting.REPORT_SUFFIXES["csv"]))
+    assert statuses([path], out_dir, formats=["csv"]) == {"claim.jsonl": "rendered"}
+
+
+def test_projects_that_would_share_report_files_are_rejected(tmp_path):
+    os.mkdir(tmp_path / "a")
+    os.mkdir(tmp_path / "b")
+    first = str(tmp_path / "a" / "claim.jsonl")
+    second = str(tmp_path / "b" / "claim.json")
+    save_project(first, ["A"])
+    save_project(second, ["B"])
+    results = list(render_projects([first, second], str(tmp_path / "reports"), formats=["csv"]))
+    assert [(r["project"], r["status"]) for r in results] == [(second, "failed"), (first, "rendered")]
+    assert results[0]["errors"] == ["reports would overwrite those of " + first]
+
+
+def test_unreadable_projects_fail_and_stay_out_of_the_manifest(tmp_path):
+    path = str(tmp_path / "broken.jsonl")
+    with open(path, "w") as f:
+        f.write("not json\n")
+    out_dir = str(tmp_path / "reports")
+    results = list(render_projects([path], out_dir, formats=["csv"]))
+    assert results[0]["status"] == "failed"
+    with open(os.path.join(out_dir, REPORT_MANIFEST)) as f:
+        assert json.load(f) == {}
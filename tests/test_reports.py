@@ -0,0 +1,19 @@
+import io
+
+from openpyxl import load_workbook
+
+from conftest import entry
+from reporting import DamageStore, create_excel_report
+
+
+def sheet_rows(data, title):
+    return list(load_workbook(io.BytesIO(data))[title].iter_rows(values_only=True))
+
+
+def test_chronological_sheet_keeps_entry_order_within_a_day():
+    damages = [entry("Later", "2024-03-02", 1.0)]
+    damages += [entry("Item " + str(i), "2024-03-01", float(i)) for i in range(40)]
+    rows = sheet_rows(create_excel_report(DamageStore(damages), "P"), "Chronological View")
+    titles = [row[2] for row in rows[4:4 + len(damages)]]
+    assert titles == ["Item " + str(i) for i in range(40)] + ["Later"]
+    assert rows[4 + len(damages) - 1][4] == sum(range(40)) + 1.0
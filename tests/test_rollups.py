@@ -0,0 +1,24 @@
+from conftest import entry
+from reporting import DamageStore, period_frame, rollup_totals, totals_from_frame
+
+RENTAL = "Property Damage - Rental vehicle costs"
+PILLS = "Medical & Health-Related - Medication costs"
+ROOF = "Other - Roof repair"
+
+
+def test_rollups_and_period_frame():
+    store = DamageStore([entry("A", "2024-01-31", 10.1), entry("B", "2024-02-01", 0.2, RENTAL),
+                         entry("C", "2024-03-15", 5.0, PILLS), entry("D", "2024-03-16", 1.0, ROOF)])
+    totals = totals_from_frame(store.frame())
+    top = rollup_totals(totals)
+    assert top["Property Damage"] == {"count": 2, "sum": 10.3, "cents": 1030}
+    assert set(top) == {"Property Damage", "Medical & Health-Related", "Other"}
+    subs = rollup_totals(totals, level="subcategory")
+    assert subs[("Property Damage", "Rental vehicle costs")]["count"] == 1
+
+    months = period_frame(totals, "month", level=None)
+    assert months.index.tolist() == ["2024-01", "2024-02", "2024-03"]
+    assert months["Total"].tolist() == [10.1, 0.2, 6.0]
+    weeks = period_frame(totals, "week", level="top", value="count")
+    assert weeks.index[0] == "2024-01-29"
+    assert weeks.sum().sum() == 4
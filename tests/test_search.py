@@ -0,0 +1,24 @@
+from conftest import entry
+from reporting import DamageStore
+
+RENTAL = "Property Damage - Rental vehicle costs"
+PILLS = "Medical & Health-Related - Medication costs"
+
+
+def test_search_combines_filters_and_follows_edits():
+    store = DamageStore([
+        entry("Tow truck", "2024-01-05", 250.0, description="after the crash"),
+        entry("Towel", "2024-02-01", 12.0, RENTAL),
+        entry("Pharmacy", "2024-03-01", 40.0, PILLS, "r.pdf"),
+    ])
+    assert store.search("tow").tolist() == [0, 1]
+    assert store.search("tow crash").tolist() == [0]
+    assert store.search(date_from="2024-01-10", date_to="2024-03-01").tolist() == [1, 2]
+    assert store.search(cost_min=20, cost_max=250).tolist() == [0, 2]
+    assert store.search(categories=[PILLS, RENTAL]).tolist() == [1, 2]
+    assert store.search(has_receipt=True).tolist() == [2]
+
+    store.delete([0])
+    store.append(entry("Tow again", "2024-04-01", 90.0))
+    assert store.search("tow").tolist() == [0, 2]
+    assert store.search(cost_max=50).tolist() == [0, 1]
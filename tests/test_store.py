@@ -0,0 +1,38 @@
+from conftest import VEHICLE, entry
+from reporting import DamageStore
+
+PILLS = "Medical & Health-Related - Medication costs"
+ROOF = "Other - Roof repair"
+
+
+def test_store_behaves_like_the_entry_list():
+    store = DamageStore([entry("A", "2024-01-02", 10.0), entry("B", "2024-01-01", 5.5, ROOF, "r.pdf")])
+    store.append(entry("C", "2024-01-03", 1.25, "Roof repair"))
+    assert len(store) == 3
+    assert [dmg["Title"] for dmg in store] == ["A", "B", "C"]
+    assert store[-1]["Category"] == ROOF
+    assert store[1]["Taxonomy"] == ("Other", "", "Roof repair")
+
+    removed = store.pop(0)
+    assert removed["Title"] == "A"
+    assert [dmg["Title"] for dmg in store] == ["B", "C"]
+    assert store.frame()["Cost"].tolist() == [5.5, 1.25]
+
+
+def test_snapshot_is_not_changed_by_later_edits():
+    store = DamageStore([entry("A", "2024-01-01", 1.0), entry("B", "2024-01-02", 2.0)])
+    snapshot = store.snapshot()
+    store.append(entry("C", "2024-01-03", 3.0, ROOF))
+    store.delete([0])
+    assert [dmg["Title"] for dmg in snapshot] == ["A", "B"]
+    assert [dmg["Title"] for dmg in store] == ["B", "C"]
+
+
+def test_store_walks_in_date_and_category_order():
+    store = DamageStore([entry("A", "2024-01-02", 1.0, PILLS), entry("B", "2024-01-01", 2.0),
+                         entry("C", "2024-01-02", 3.0), entry("D", "2024-01-01", 4.0, PILLS)])
+    assert [row[0] for row in store.rows(("Title",), store.date_order())] == ["B", "D", "A", "C"]
+    groups = store.category_positions()
+    assert list(groups) == [PILLS, VEHICLE]
+    assert groups[PILLS].tolist() == [0, 3]
+    assert store.missing_receipt_positions().tolist() == [0, 1, 2, 3]
@@ -0,0 +1,77 @@
+import random
+
+from conftest import VEHICLE, entry, new_project
+from reporting import DamageStore, add_to_totals, copy_totals, remove_from_totals, totals_from_frame
+
+RENTAL = "Property Damage - Rental vehicle costs"
+PILLS = "Medical & Health-Related - Medication costs"
+ROOF = "Other - Roof repair"
+
+
+def random_entry(rng, i):
+    return entry("Item " + str(i), "2024-%02d-%02d" % (rng.randint(1, 12), rng.randint(1, 28)),
+                 round(rng.uniform(0, 500), 2), rng.choice([VEHICLE, RENTAL, PILLS, ROOF]),
+                 rng.choice(["", "r.pdf"]))
+
+
+def test_incremental_totals_match_a_rebuild_exactly():
+    rng = random.Random(7)
+    store = DamageStore([random_entry(rng, i) for i in range(50)])
+    totals = totals_from_frame(store.frame())
+    for i in range(3000):
+        if len(store) > 1 and rng.random() < 0.5:
+            removed = store.pop(rng.randrange(len(store)))
+            remove_from_totals(totals, removed, store)
+        else:
+            store.append(random_entry(rng, i))
+            add_to_totals(totals, store[-1])
+    assert totals == totals_from_frame(store.frame())
+    assert totals["cents"] == round(sum(dmg["Cost"] for dmg in store) * 100)
+
+
+def test_totals_copy_does_not_follow_the_original():
+    store = DamageStore([entry("A", "2024-01-01", 1.5)])
+    totals = totals_from_frame(store.frame())
+    copied = copy_totals(totals)
+    store.append(entry("B", "2024-01-01", 2.0))
+    add_to_totals(totals, store[-1])
+    assert copied["sum"] == 1.5
+    assert copied["categories"][VEHICLE]["count"] == 1
+    assert copied["periods"]["month"]["2024-01"][VEHICLE]["sum"] == 1.5
+
+
+def test_removing_the_last_entry_resets_the_totals():
+    store = DamageStore([entry("A", "2024-01-01", 1.5)])
+    totals = totals_from_frame(store.frame())
+    remove_from_totals(totals, store.pop(0), store)
+    assert totals == totals_from_frame(store.frame())
+    assert totals["count"] == 0 and totals["categories"] == {}
+
+
+def test_adding_and_deleting_entries_updates_the_session_totals(app, monkeypatch):
+    app["apply_project"](new_project([entry("A", cost=10.0)]))
+    session = app["st"].session_state
+    rebuilds = []
+    monkeypatch.setitem(app, "totals_from_frame", lambda df: rebuilds.append(len(df)) or totals_from_frame(df))
+
+    app["add_damage_entry"](entry("B", "2024-04-01", 5.0, "roof repair"))
+    totals = session["damage_totals"]
+    assert (totals["count"], totals["sum"]) == (2, 15.0)
+    assert totals["categories"]["Other - roof repair"]["count"] == 1
+
+    rng = random.Random(3)
+    for i in range(40):
+        app["add_damage_entry"](random_entry(rng, i))
+    assert session["damage_totals"] == totals_from_frame(session["damages"].frame())
+
+    # The only entry of its category, the oldest and the most expensive ones
+    costs = [dmg["Cost"] for dmg in session["damages"]]
+    dates = [dmg["Date"] for dmg in session["damages"]]
+    removed = app["delete_damage_entries"]([1, dates.index(min(dates)), costs.index(max(costs)), 5, 6])
+    assert len(removed) == len(set([1, dates.index(min(dates)), costs.index(max(costs)), 5, 6]))
+    assert "Other - roof repair" not in session["damage_totals"]["categories"]
+    assert session["damage_totals"] == totals_from_frame(session["damages"].frame())
+
+    app["delete_damage_entries"](range(len(session["damages"])))
+    assert session["damage_totals"]["count"] == 0
+    assert rebuilds == []